@@ -0,0 +1,27 @@
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import request
+
+
+class ProductConfiguratorController(http.Controller):
+    @http.route(
+        "/product_configurator/session/<int:session_id>/delta",
+        type="json",
+        auth="user",
+    )
+    def config_session_delta(self, session_id, delta, image_size=None):
+        """Apply a change of the configuration of a session and return the
+        availability of the attributes it affects along with the price,
+        weight and image url of the configuration, see
+        product.config.session.apply_config_delta()
+
+        :param session_id: id of the product.config.session
+        :param delta: dictionary {attribute_id: value_id, list of value ids
+                      or False to clear the attribute}
+        :param image_size: size of the configuration image
+        """
+        session = request.env["product.config.session"].browse(session_id).exists()
+        if not session:
+            raise NotFound()
+        return session.apply_config_delta(delta, image_size=image_size)
@@ -1,4 +1,5 @@
 from . import product_config
 from . import product_attribute
 from . import product
+from . import product_pricelist
 from . import ir_ui_view
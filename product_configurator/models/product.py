@@ -82,6 +82,13 @@ class ProductTemplate(models.Model):
         copy=False,
     )
 
+    config_price_rule_ids = fields.One2many(
+        comodel_name="product.config.price.rule",
+        inverse_name="product_tmpl_id",
+        string="Price Rules",
+        copy=False,
+    )
+
     config_image_ids = fields.One2many(
         comodel_name="product.config.image",
         inverse_name="product_tmpl_id",
@@ -89,6 +96,21 @@ class ProductTemplate(models.Model):
         copy=True,
     )
 
+    config_image_mode = fields.Selection(
+        selection=[
+            ("match", "Best Matching Image"),
+            ("layers", "Stacked Value Images"),
+        ],
+        string="Configuration Image Mode",
+        default="match",
+        required=True,
+        help="Best Matching Image: show the configuration image sharing the "
+        "most values with the configuration.\n"
+        "Stacked Value Images: compose the image by stacking the images of "
+        "the selected attribute values in the sequence of the attribute "
+        "lines, the rendered images are cached.",
+    )
+
     attribute_value_line_ids = fields.One2many(
         comodel_name="product.attribute.value.line",
         inverse_name="product_tmpl_id",
@@ -121,6 +143,13 @@ class ProductTemplate(models.Model):
         help="Manual setting of product template weight",
     )
 
+    config_price_version = fields.Integer(
+        readonly=True,
+        copy=False,
+        help="Incremented when the prices of the template change, sessions "
+        "computed with an older version are recomputed by a scheduled action",
+    )
+
     @api.depends("weight_dummy", "product_variant_ids", "product_variant_ids.weight")
     def _compute_weight(self):
         config_products = self.filtered(lambda template: template.config_ok)
@@ -323,17 +352,42 @@ class ProductTemplate(models.Model):
         if change_config_ok or configurable_templates:
             self[:1].check_config_user_access()
 
-        return super(ProductTemplate, self).write(vals)
+        res = super(ProductTemplate, self).write(vals)
+        if change_config_ok:
+            # The caches of the attribute values and lines are only
+            # invalidated for configurable templates
+            self.clear_caches()
+        if "list_price" in vals or "standard_price" in vals:
+            self.env["product.attribute.value"]._clear_extra_prices_cache(
+                [("product_id.product_tmpl_id", "in", self.ids)]
+            )
+        if "list_price" in vals:
+            self.env["product.config.session"]._recompute_template_prices(
+                self.filtered("config_ok").ids
+            )
+        self.env["product.config.session"]._clear_config_memo()
+        return res
 
     @api.constrains("config_line_ids")
     def _check_config_line_domain(self):
         attribute_line_ids = self.attribute_line_ids
         tmpl_value_ids = attribute_line_ids.mapped("value_ids")
         tmpl_attribute_ids = attribute_line_ids.mapped("attribute_id")
+        domains = {}
+        for template in self:
+            domains.update(
+                self.env["product.config.session"]._get_config_restrictions(
+                    template.id
+                )["domains"]
+            )
         error_message = False
         for domain_id in self.config_line_ids.mapped("domain_id"):
-            domain_attr_ids = domain_id.domain_line_ids.mapped("attribute_id")
-            domain_value_ids = domain_id.domain_line_ids.mapped("value_ids")
+            domain_attr_ids = self.env["product.attribute"].browse(
+                domains[domain_id.id]["attr_ids"]
+            )
+            domain_value_ids = self.env["product.attribute.value"].browse(
+                domains[domain_id.id]["value_ids"]
+            )
             invalid_value_ids = domain_value_ids - tmpl_value_ids
             invalid_attribute_ids = domain_attr_ids - tmpl_attribute_ids
             if not invalid_value_ids and not invalid_value_ids:
@@ -374,29 +428,58 @@ class ProductProduct(models.Model):
         conversions = {"float": float, "integer": int}
         return conversions
 
-    @api.constrains("product_template_attribute_value_ids")
-    def _check_duplicate_product(self):
-        """Check for prducts with same attribute values/custom values"""
+    @api.depends(
+        "product_tmpl_id.config_ok",
+        "product_template_attribute_value_ids.product_attribute_value_id",
+    )
+    def _compute_config_fingerprint(self):
+        config_session_obj = self.env["product.config.session"]
+        custom_value_id = config_session_obj.get_custom_value_id()
         for product in self:
             if not product.config_ok:
+                product.config_fingerprint = False
                 continue
-
-            # At the moment, I don't have enough confidence with my
-            # understanding of binary attributes, so will leave these
-            # as not matching...
-            # In theory, they should just work, if they are set to "non search"
-            # in custom field def!
-            # TODO: Check the logic with binary attributes
-            config_session_obj = product.env["product.config.session"]
             ptav_ids = product.product_template_attribute_value_ids.mapped(
                 "product_attribute_value_id"
             )
-            duplicates = config_session_obj.search_variant(
-                product_tmpl_id=product.product_tmpl_id,
-                value_ids=ptav_ids.ids,
-            ).filtered(lambda p: p.id != product.id)
+            # Variants holding a custom value are never matched by a search
+            if custom_value_id & ptav_ids:
+                product.config_fingerprint = False
+                continue
+            product.config_fingerprint = config_session_obj.get_config_fingerprint(
+                product.product_tmpl_id.id, ptav_ids.ids
+            )
 
-            if duplicates:
+    @api.constrains("product_template_attribute_value_ids")
+    def _check_duplicate_product(self):
+        """Check for prducts with same attribute values/custom values"""
+        # At the moment, I don't have enough confidence with my
+        # understanding of binary attributes, so will leave these
+        # as not matching...
+        # In theory, they should just work, if they are set to "non search"
+        # in custom field def!
+        # TODO: Check the logic with binary attributes
+        config_products = self.filtered(lambda p: p.config_fingerprint)
+        if not config_products:
+            return
+        duplicates = self.search(
+            [
+                ("config_ok", "=", True),
+                (
+                    "config_fingerprint",
+                    "in",
+                    config_products.mapped("config_fingerprint"),
+                ),
+            ]
+        )
+        fingerprint_product_ids = {}
+        for duplicate in duplicates:
+            fingerprint_product_ids.setdefault(duplicate.config_fingerprint, set()).add(
+                duplicate.id
+            )
+        for product in config_products:
+            product_ids = fingerprint_product_ids.get(product.config_fingerprint, ())
+            if set(product_ids) - {product.id}:
                 raise ValidationError(
                     _(
                         "Configurable Products cannot have duplicates "
@@ -445,7 +528,28 @@ class ProductProduct(models.Model):
 
     @api.depends("product_template_attribute_value_ids.weight_extra")
     def _compute_product_weight_extra(self):
-        for product in self:
+        # Sum the extra weights of all the stored variants with one query
+        products = self.filtered("id")
+        weight_extras = {}
+        if products:
+            self.env["product.template.attribute.value"].flush(["weight_extra"])
+            products.flush(["product_template_attribute_value_ids"])
+            for sub_ids in self.env.cr.split_for_in_conditions(products.ids):
+                self.env.cr.execute(
+                    """
+                    SELECT comb.product_product_id, SUM(ptav.weight_extra)
+                    FROM product_variant_combination comb
+                    JOIN product_template_attribute_value ptav
+                        ON ptav.id = comb.product_template_attribute_value_id
+                    WHERE comb.product_product_id IN %s
+                    GROUP BY comb.product_product_id
+                    """,
+                    (sub_ids,),
+                )
+                weight_extras.update(self.env.cr.fetchall())
+        for product in products:
+            product.weight_extra = weight_extras.get(product.id) or 0.0
+        for product in self - products:
             product.weight_extra = sum(
                 product.mapped("product_template_attribute_value_ids.weight_extra")
             )
@@ -463,10 +567,86 @@ class ProductProduct(models.Model):
         """Store weight in dummy field"""
         self.weight_dummy = self.weight
 
+    def _set_config_image_field(self, field_name):
+        """Show the image of the configuration image record on the variants
+        without an image of their own instead of copying it on each of them"""
+        for product in self:
+            if product.config_image_id and not product.image_variant_128:
+                product[field_name] = product.config_image_id.sudo()[field_name]
+
+    @api.depends(
+        "image_variant_1920",
+        "product_tmpl_id.image_1920",
+        "config_image_id.image_1920",
+    )
+    def _compute_image_1920(self):
+        super(ProductProduct, self)._compute_image_1920()
+        self._set_config_image_field("image_1920")
+
+    @api.depends(
+        "image_variant_1024",
+        "product_tmpl_id.image_1024",
+        "config_image_id.image_1024",
+    )
+    def _compute_image_1024(self):
+        super(ProductProduct, self)._compute_image_1024()
+        self._set_config_image_field("image_1024")
+
+    @api.depends(
+        "image_variant_512",
+        "product_tmpl_id.image_512",
+        "config_image_id.image_512",
+    )
+    def _compute_image_512(self):
+        super(ProductProduct, self)._compute_image_512()
+        self._set_config_image_field("image_512")
+
+    @api.depends(
+        "image_variant_256",
+        "product_tmpl_id.image_256",
+        "config_image_id.image_256",
+    )
+    def _compute_image_256(self):
+        super(ProductProduct, self)._compute_image_256()
+        self._set_config_image_field("image_256")
+
+    @api.depends(
+        "image_variant_128",
+        "product_tmpl_id.image_128",
+        "config_image_id.image_128",
+    )
+    def _compute_image_128(self):
+        super(ProductProduct, self)._compute_image_128()
+        self._set_config_image_field("image_128")
+
+    @api.depends(
+        "can_image_variant_1024_be_zoomed",
+        "product_tmpl_id.can_image_1024_be_zoomed",
+        "config_image_id.can_image_1024_be_zoomed",
+    )
+    def _compute_can_image_1024_be_zoomed(self):
+        super(ProductProduct, self)._compute_can_image_1024_be_zoomed()
+        self._set_config_image_field("can_image_1024_be_zoomed")
+
     config_name = fields.Char(
         string="Configuration Name", compute="_compute_config_name"
     )
     weight_extra = fields.Float(compute="_compute_product_weight_extra", store=True)
+    config_fingerprint = fields.Char(
+        compute="_compute_config_fingerprint",
+        store=True,
+        index=True,
+        copy=False,
+        help="Hash of the template and of the attribute values of the "
+        "configured variant",
+    )
+    config_image_id = fields.Many2one(
+        comodel_name="product.config.image",
+        string="Configuration Image",
+        ondelete="set null",
+        help="Image shared by the variants of this configuration, used when "
+        "the variant has no image of its own",
+    )
     weight_dummy = fields.Float(string="Manual Weight", digits="Stock Weight")
     weight = fields.Float(
         compute="_compute_product_weight",
@@ -549,7 +729,13 @@ class ProductProduct(models.Model):
         if change_config_ok or configurable_products:
             self[:1].check_config_user_access(mode="write")
 
-        return super(ProductProduct, self).write(vals)
+        res = super(ProductProduct, self).write(vals)
+        if "lst_price" in vals or "standard_price" in vals:
+            self.env["product.attribute.value"]._clear_extra_prices_cache(
+                [("product_id", "in", self.ids)]
+            )
+            self.env["product.config.session"]._clear_config_memo()
+        return res
 
     # pylint:disable=missing-return
     def _compute_product_price_extra(self):
@@ -557,12 +743,23 @@ class ProductProduct(models.Model):
         config_products = self - standard_products
         if standard_products:
             super(ProductProduct, standard_products)._compute_product_price_extra()
+        # Extra prices are computed once per template, then summed per variant
+        attribute_value_obj = self.env["product.attribute.value"]
+        pricelist = self.env.user.partner_id.property_product_pricelist
+        # Prefetch the attribute values of all the variants at once
+        config_products.mapped(
+            "product_template_attribute_value_ids.product_attribute_value_id"
+        )
+        template_prices = {
+            product_tmpl.id: attribute_value_obj._get_template_extra_prices(
+                product_tmpl.id, pricelist
+            )["prices"]
+            for product_tmpl in config_products.mapped("product_tmpl_id")
+        }
         for product in config_products:
-            attribute_value_obj = self.env["product.attribute.value"]
-            value_ids = (
-                product.product_template_attribute_value_ids.product_attribute_value_id
-            )
-            extra_prices = attribute_value_obj.get_attribute_value_extra_prices(
-                product_tmpl_id=product.product_tmpl_id.id, pt_attr_value_ids=value_ids
+            extra_prices = template_prices[product.product_tmpl_id.id]
+            ptavs = product.product_template_attribute_value_ids
+            product.price_extra = sum(
+                extra_prices.get(value_id, 0.0)
+                for value_id in ptavs.product_attribute_value_id.ids
             )
-            product.price_extra = sum(extra_prices.values())
@@ -1,6 +1,6 @@
 from ast import literal_eval
 
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import ValidationError
 
 
@@ -19,6 +19,14 @@ class ProductAttribute(models.Model):
             new_attrs += super(ProductAttribute, attr).copy(default)
         return new_attrs
 
+    def write(self, vals):
+        """Invalidate the generated configuration fields and views when the
+        attribute settings they are built from change"""
+        res = super(ProductAttribute, self).write(vals)
+        if "name" in vals or "custom_type" in vals:
+            self.clear_caches()
+        return res
+
     @api.model
     def _get_nosearch_fields(self):
         """Return a list of custom field types that do not support searching"""
@@ -177,6 +185,41 @@ class ProductAttributeLine(models.Model):
 
     sequence = fields.Integer(default=10)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductAttributeLine, self).create(vals_list)
+        if res.mapped("product_tmpl_id").filtered("config_ok"):
+            self.clear_caches()
+            self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the compiled configuration data of the configurable
+        templates when the values or the settings of a line change"""
+        res = super(ProductAttributeLine, self).write(vals)
+        if set(vals) & {
+            "attribute_id",
+            "value_ids",
+            "custom",
+            "required",
+            "multi",
+            "sequence",
+            "active",
+        } and self.mapped("product_tmpl_id").filtered("config_ok"):
+            self.clear_caches()
+            self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        """Config lines are removed in cascade by the database, invalidate
+        the compiled restrictions of the configurable templates"""
+        config_tmpls = self.mapped("product_tmpl_id").filtered("config_ok")
+        res = super(ProductAttributeLine, self).unlink()
+        if config_tmpls:
+            self.clear_caches()
+            self.env["product.config.session"]._clear_config_memo()
+        return res
+
     @api.constrains("value_ids", "default_val")
     def _check_default_values(self):
         """default value should not be outside of the
@@ -256,14 +299,144 @@ class ProductAttributeValue(models.Model):
         help="Attribute value image (Display on website for radio buttons)",
     )
 
+    def write(self, vals):
+        """Invalidate the cached extra prices when the related product of a
+        value changes"""
+        res = super(ProductAttributeValue, self).write(vals)
+        if "product_id" in vals or "active" in vals:
+            self.clear_caches()
+            self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    @api.model
+    def _clear_extra_prices_cache(self, domain):
+        """Invalidate the cached extra prices if the price of products
+        related to attribute values changed
+
+        :param domain: domain matching the attribute values related to the
+                       products whose price changed
+        """
+        if self.sudo().search_count(domain):
+            self.clear_caches()
+
+    @api.model
+    @tools.ormcache(
+        "product_tmpl_id",
+        "pricelist_id",
+        "company_id",
+        "currency_id",
+        "date",
+        "quantity",
+        "partner_id",
+        "uom_id",
+    )
+    def _get_extra_prices_vector(
+        self,
+        product_tmpl_id,
+        pricelist_id,
+        company_id,
+        currency_id,
+        date,
+        quantity,
+        partner_id,
+        uom_id,
+    ):
+        """Compute once the extra prices of all the attribute values of a
+        product template for a pricelist, company, currency, day, quantity,
+        partner and unit of measure
+
+        The cache is cleared whenever a template attribute value extra
+        price, a pricelist item or the price of a related product changes.
+
+        :returns: dictionary of the form {
+            'value_ids': frozenset of the attribute value ids of the template,
+            'prices': {attribute_value_id: extra price},
+        }
+        """
+        attr_values = (
+            self.env["product.template.attribute.value"]
+            .sudo()
+            .search([("product_tmpl_id", "=", product_tmpl_id)])
+            .mapped("product_attribute_value_id")
+        )
+        pricelist = self.env["product.pricelist"].sudo().browse(pricelist_id)
+        extra_prices = (
+            self.sudo()
+            .with_context(quantity=quantity, partner=partner_id, uom=uom_id, date=date)
+            ._compute_attribute_value_extra_prices(
+                product_tmpl_id, attr_values, pricelist
+            )
+        )
+        return {
+            "value_ids": frozenset(attr_values.ids),
+            "prices": extra_prices,
+        }
+
+    @api.model
+    def _get_extra_prices_key(self, pricelist=None):
+        """Return the pricelist, company, currency, date, quantity, partner
+        and unit of measure the extra prices are computed for, from the
+        context, as arguments of _get_extra_prices_vector"""
+        if not pricelist:
+            pricelist = self.env.user.partner_id.property_product_pricelist
+        date = fields.Date.to_date(
+            self.env.context.get("date")
+        ) or fields.Date.context_today(self)
+        partner = self.env.context.get("partner") or False
+        if isinstance(partner, models.BaseModel):
+            partner = partner.id
+        return (
+            pricelist.id,
+            self.env.company.id,
+            pricelist.currency_id.id,
+            date,
+            self.env.context.get("quantity") or 1.0,
+            partner,
+            self.env.context.get("uom") or False,
+        )
+
+    @api.model
+    def _get_template_extra_prices(self, product_tmpl_id, pricelist=None):
+        """Return the cached extra prices of the attribute values of a
+        product template for the pricelist, company, date, quantity, partner
+        and unit of measure of the context, see _get_extra_prices_vector"""
+        return self._get_extra_prices_vector(
+            product_tmpl_id or False, *self._get_extra_prices_key(pricelist)
+        )
+
     @api.model
     def get_attribute_value_extra_prices(
         self, product_tmpl_id, pt_attr_value_ids, pricelist=None
     ):
-        extra_prices = {}
         if not pricelist:
             pricelist = self.env.user.partner_id.property_product_pricelist
 
+        extra_prices_vector = self._get_template_extra_prices(
+            product_tmpl_id, pricelist
+        )
+        template_value_ids = extra_prices_vector["value_ids"]
+        template_prices = extra_prices_vector["prices"]
+        extra_prices = {}
+        remaining_av_ids = self.browse()
+        for av in pt_attr_value_ids:
+            if av.id not in template_value_ids:
+                remaining_av_ids |= av
+            elif av.id in template_prices:
+                extra_prices[av.id] = template_prices[av.id]
+        # Values which are not set on the template
+        if remaining_av_ids:
+            extra_prices.update(
+                self._compute_attribute_value_extra_prices(
+                    product_tmpl_id, remaining_av_ids, pricelist
+                )
+            )
+        return extra_prices
+
+    @api.model
+    def _compute_attribute_value_extra_prices(
+        self, product_tmpl_id, pt_attr_value_ids, pricelist
+    ):
+        extra_prices = {}
         related_product_av_ids = self.env["product.attribute.value"].search(
             [("id", "in", pt_attr_value_ids.ids), ("product_id", "!=", False)]
         )
@@ -371,6 +544,56 @@ class ProductAttributePrice(models.Model):
 
     weight_extra = fields.Float(string="Attribute Weight Extra", digits="Stock Weight")
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductAttributePrice, self).create(vals_list)
+        config_tmpls = res.mapped("product_tmpl_id").filtered("config_ok")
+        if config_tmpls:
+            self.clear_caches()
+            self.env["product.config.session"]._recompute_template_prices(
+                config_tmpls.ids
+            )
+        return res
+
+    def write(self, vals):
+        """Invalidate the memoized configuration prices and weights and the
+        cached extra prices and weights of the configurable templates"""
+        res = super(ProductAttributePrice, self).write(vals)
+        config_tmpls = self.mapped("product_tmpl_id").filtered("config_ok")
+        if not config_tmpls:
+            return res
+        if "price_extra" in vals or "weight_extra" in vals:
+            self.clear_caches()
+        if "price_extra" in vals:
+            self.env["product.config.session"]._recompute_template_prices(
+                config_tmpls.ids
+            )
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        config_tmpl_ids = self.mapped("product_tmpl_id").filtered("config_ok").ids
+        res = super(ProductAttributePrice, self).unlink()
+        if config_tmpl_ids:
+            self.clear_caches()
+            self.env["product.config.session"]._recompute_template_prices(
+                config_tmpl_ids
+            )
+        return res
+
+    @api.model
+    @tools.ormcache("product_tmpl_id")
+    def _get_template_weight_extras(self, product_tmpl_id):
+        """Return the extra weight of the attribute values of a product
+        template as a dictionary {attribute_value_id: weight_extra}"""
+        weight_extras = {}
+        for ptav in self.sudo().search([("product_tmpl_id", "=", product_tmpl_id)]):
+            attr_val_id = ptav.product_attribute_value_id.id
+            weight_extras[attr_val_id] = (
+                weight_extras.get(attr_val_id, 0.0) + ptav.weight_extra
+            )
+        return weight_extras
+
 
 class ProductAttributeValueLine(models.Model):
     _name = "product.attribute.value.line"
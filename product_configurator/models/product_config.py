@@ -1,41 +1,56 @@
+import hashlib
 import logging
+import threading
 from ast import literal_eval
 
-from odoo import _, api, fields, models
-from odoo.exceptions import UserError, ValidationError
-from odoo.tools.misc import formatLang
+from PIL import Image
+from psycopg2 import IntegrityError, OperationalError, errorcodes
+
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import AccessError, UserError, ValidationError
+from odoo.tools import image as image_tools
+from odoo.tools.misc import formatLang, frozendict
+from odoo.tools.safe_eval import safe_eval, test_python_expr
 
 _logger = logging.getLogger(__name__)
 
+CONFIG_IMAGE_SIZES = (128, 256, 512, 1024, 1920)
+
 
 class ProductConfigDomain(models.Model):
     _name = "product.config.domain"
     _description = "Domain for Config Restrictions"
 
-    @api.depends("implied_ids")
+    @api.depends("implied_ids", "implied_ids.trans_implied_ids")
     def _get_trans_implied(self):
         """Computes the transitive closure of relation implied_ids"""
-
-        def linearize(domains):
-            trans_domains = domains
-            for domain in domains:
-                implied_domains = domain.implied_ids - domain
-                if implied_domains:
-                    trans_domains |= linearize(implied_domains)
-            return trans_domains
-
         for domain in self:
-            domain.trans_implied_ids = linearize(domain)
+            trans_domains = domain
+            implied_domains = domain.implied_ids - trans_domains
+            while implied_domains:
+                trans_domains |= implied_domains
+                implied_domains = implied_domains.mapped("implied_ids") - trans_domains
+            domain.trans_implied_ids = trans_domains
+
+    @api.constrains("implied_ids")
+    def _check_implied_recursion(self):
+        if not self._check_m2m_recursion("implied_ids"):
+            raise ValidationError(
+                _("Error! You cannot create recursive inherited restrictions.")
+            )
 
     def compute_domain(self):
         """Returns a list of domains defined on a
         product.config.domain_line_ids and all implied_ids"""
         # TODO: Enable the usage of OR operators between implied_ids
         # TODO: Add implied_ids sequence field to enforce order of operations
-        # TODO: Prevent circular dependencies
+        all_lines = self.env["product.config.domain.line"].search(
+            [("domain_id", "in", self.mapped("trans_implied_ids").ids)]
+        )
         computed_domain = []
         for domain in self:
-            lines = domain.trans_implied_ids.mapped("domain_line_ids").sorted()
+            trans_domains = domain.trans_implied_ids
+            lines = all_lines.filtered(lambda line: line.domain_id in trans_domains)
             if not lines:
                 continue
             for line in lines[:-1]:
@@ -72,11 +87,34 @@ class ProductConfigDomain(models.Model):
     trans_implied_ids = fields.Many2many(
         comodel_name="product.config.domain",
         compute=_get_trans_implied,
+        relation="product_config_domain_trans_implied_rel",
         column1="domain_id",
         column2="parent_id",
         string="Transitively inherits",
+        store=True,
+        recursive=True,
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigDomain, self).create(vals_list)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the compiled restrictions of the product templates"""
+        res = super(ProductConfigDomain, self).write(vals)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        res = super(ProductConfigDomain, self).unlink()
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
 
 class ProductConfigDomainLine(models.Model):
     _name = "product.config.domain.line"
@@ -146,6 +184,26 @@ class ProductConfigDomainLine(models.Model):
         help="Set the order of operations for evaluation domain lines",
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigDomainLine, self).create(vals_list)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the compiled restrictions of the product templates"""
+        res = super(ProductConfigDomainLine, self).write(vals)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        res = super(ProductConfigDomainLine, self).unlink()
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
 
 class ProductConfigLine(models.Model):
     _name = "product.config.line"
@@ -212,6 +270,26 @@ class ProductConfigLine(models.Model):
     )
     sequence = fields.Integer(default=10)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigLine, self).create(vals_list)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the compiled restrictions of the product templates"""
+        res = super(ProductConfigLine, self).write(vals)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        res = super(ProductConfigLine, self).unlink()
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
     @api.constrains("value_ids")
     def check_value_attributes(self):
         """Values selected in config lines must belong to the
@@ -228,6 +306,151 @@ class ProductConfigLine(models.Model):
                 )
 
 
+class ProductConfigPriceRule(models.Model):
+    _name = "product.config.price.rule"
+    _description = "Product Config Price Rule"
+    _order = "product_tmpl_id, sequence, id"
+
+    name = fields.Char(required=True, translate=True)
+    product_tmpl_id = fields.Many2one(
+        comodel_name="product.template",
+        string="Product Template",
+        ondelete="cascade",
+        required=True,
+    )
+    attribute_line_id = fields.Many2one(
+        comodel_name="product.template.attribute.line",
+        string="Attribute Line",
+        ondelete="cascade",
+        required=True,
+    )
+    expression = fields.Text(
+        required=True,
+        help="Python expression returning the amount added to the price "
+        "when the attribute of the line is configured. Available variables:\n"
+        "- custom_value: custom value of the attribute (a number for "
+        "integer and float attributes), False if none\n"
+        "- custom_values: dictionary {attribute id: custom value}\n"
+        "- value_ids: ids of the selected attribute values\n"
+        "- price: price of the configuration before the price rules",
+    )
+    sequence = fields.Integer(default=10)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigPriceRule, self).create(vals_list)
+        self._clear_price_rules_cache(res.mapped("product_tmpl_id"))
+        return res
+
+    def write(self, vals):
+        """Invalidate the cached price rules and propagate the change to
+        the prices of the configuration sessions"""
+        product_tmpls = self.mapped("product_tmpl_id")
+        res = super(ProductConfigPriceRule, self).write(vals)
+        self._clear_price_rules_cache(product_tmpls | self.mapped("product_tmpl_id"))
+        return res
+
+    def unlink(self):
+        product_tmpls = self.mapped("product_tmpl_id")
+        res = super(ProductConfigPriceRule, self).unlink()
+        self._clear_price_rules_cache(product_tmpls)
+        return res
+
+    @api.model
+    def _clear_price_rules_cache(self, product_tmpls):
+        self.clear_caches()
+        session_obj = self.env["product.config.session"]
+        session_obj._clear_config_memo()
+        session_obj._recompute_template_prices(product_tmpls.ids)
+
+    @api.constrains("expression")
+    def _check_expression(self):
+        for rule in self:
+            try:
+                msg = test_python_expr(expr=rule.expression.strip(), mode="eval")
+            except NameError as ex:
+                # Raised for forbidden names such as dunder attributes
+                msg = ex
+            if msg:
+                raise ValidationError(
+                    _("Invalid expression on price rule '%s': %s") % (rule.name, msg)
+                )
+
+    @api.constrains("attribute_line_id", "product_tmpl_id")
+    def _check_attribute_line(self):
+        for rule in self:
+            if rule.attribute_line_id.product_tmpl_id != rule.product_tmpl_id:
+                raise ValidationError(
+                    _(
+                        "The attribute line of price rule '%s' must belong to "
+                        "its product template"
+                    )
+                    % rule.name
+                )
+
+    @api.model
+    @tools.ormcache("product_tmpl_id")
+    def _get_template_price_rules(self, product_tmpl_id):
+        """Return the price rules of a product template, the cache is cleared
+        whenever a rule changes
+
+        Only the expressions are cached, they are not compiled, see
+        _get_price_rules_extra.
+
+        :param product_tmpl_id: id of the product.template
+        :returns: tuple of (rule id, attribute id, expression)
+        """
+        rules = self.sudo().search([("product_tmpl_id", "=", product_tmpl_id)])
+        return tuple(
+            (rule.id, rule.attribute_line_id.attribute_id.id, rule.expression.strip())
+            for rule in rules
+        )
+
+    @api.model
+    def _get_price_rules_extra(self, product_tmpl_id, value_ids, custom_vals, price):
+        """Evaluate the price rules of the template whose attribute is
+        configured with value_ids or custom_vals
+
+        Every expression is parsed and checked again by safe_eval on each
+        evaluation, there is no cache of compiled code. Evaluations are only
+        saved by the per-transaction memo of get_cfg_price.
+
+        :param product_tmpl_id: id of the product.template
+        :param value_ids: list of product.attribute.value ids
+        :param custom_vals: dictionary {attribute_id: custom_value}
+        :param price: price of the configuration before the price rules
+        :returns: sum of the amounts returned by the rules
+        """
+        price_rules = self._get_template_price_rules(product_tmpl_id)
+        if not price_rules:
+            return 0.0
+        attr_ids = set(
+            self.env["product.attribute.value"]
+            .browse(value_ids)
+            .mapped("attribute_id")
+            .ids
+        )
+        attr_ids |= {attr_id for attr_id, val in custom_vals.items() if val}
+        eval_context = {
+            "custom_values": dict(custom_vals),
+            "value_ids": list(value_ids),
+            "price": price,
+        }
+        price_extra = 0.0
+        for rule_id, attr_id, expression in price_rules:
+            if attr_id not in attr_ids:
+                continue
+            eval_context["custom_value"] = custom_vals.get(attr_id, False)
+            try:
+                price_extra += safe_eval(expression, dict(eval_context))
+            except Exception as ex:
+                raise UserError(
+                    _("Error while evaluating price rule '%s': %s")
+                    % (self.browse(rule_id).name, ex)
+                ) from ex
+        return price_extra
+
+
 class ProductConfigImage(models.Model):
     _name = "product.config.image"
     _inherit = ["image.mixin"]
@@ -246,6 +469,55 @@ class ProductConfigImage(models.Model):
         comodel_name="product.attribute.value", string="Configuration"
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigImage, self).create(vals_list)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the cached image index and memoized configuration
+        images"""
+        res = super(ProductConfigImage, self).write(vals)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        res = super(ProductConfigImage, self).unlink()
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    @api.model
+    @tools.ormcache("product_tmpl_id")
+    def _get_config_image_index(self, product_tmpl_id):
+        """Index the configuration images of a product template by attribute
+        value so the best matching image is found by only looking at the
+        images sharing values with the configuration
+
+        :param product_tmpl_id: id of the product.template
+        :returns: dictionary of the form {
+            'value_images': {attribute_value_id: tuple(image ids)},
+            'positions': {image id: position in the images sequence},
+        }
+        """
+        product_tmpl = self.env["product.template"].sudo().browse(product_tmpl_id)
+        value_images = {}
+        positions = {}
+        for position, config_image in enumerate(product_tmpl.config_image_ids):
+            positions[config_image.id] = position
+            for value_id in config_image.value_ids.ids:
+                value_images.setdefault(value_id, []).append(config_image.id)
+        return {
+            "value_images": {
+                value_id: tuple(image_ids)
+                for value_id, image_ids in value_images.items()
+            },
+            "positions": positions,
+        }
+
     @api.constrains("value_ids")
     def _check_value_ids(self):
         """Check combination of values is possible according to given
@@ -268,6 +540,164 @@ class ProductConfigImage(models.Model):
                 ) from ex
 
 
+class ProductConfigImageCache(models.Model):
+    _name = "product.config.image.cache"
+    _inherit = ["image.mixin"]
+    _description = "Product Config Rendered Image"
+    _order = "last_used desc"
+
+    product_tmpl_id = fields.Many2one(
+        comodel_name="product.template",
+        string="Product",
+        ondelete="cascade",
+        required=True,
+        index=True,
+    )
+    key = fields.Char(
+        required=True,
+        index=True,
+        help="Hash of the template and of the layers (attribute values and "
+        "image checksums) the image was rendered from",
+    )
+    last_used = fields.Datetime(default=fields.Datetime.now, index=True)
+
+    _sql_constraints = [
+        ("key_uniq", "unique(key)", "A rendered image already exists for this key.")
+    ]
+
+    @api.model
+    def _get_layers(self, product_tmpl, value_ids):
+        """Return the attribute values of value_ids having an image, in the
+        sequence of the attribute lines of the template and of the values,
+        along with the checksums of their images
+
+        :returns: tuple (product.attribute.value recordset,
+                         {attribute_value_id: image checksum})
+        """
+        attachments = (
+            self.env["ir.attachment"]
+            .sudo()
+            .search_read(
+                [
+                    ("res_model", "=", "product.attribute.value"),
+                    ("res_field", "=", "image"),
+                    ("res_id", "in", list(value_ids)),
+                ],
+                ["res_id", "checksum"],
+            )
+        )
+        checksums = {att["res_id"]: att["checksum"] for att in attachments}
+        line_sequence = {
+            line.attribute_id.id: position
+            for position, line in enumerate(product_tmpl.attribute_line_ids)
+        }
+        layers = (
+            self.env["product.attribute.value"]
+            .browse(list(checksums))
+            .sorted(
+                lambda value: (
+                    line_sequence.get(value.attribute_id.id, len(line_sequence)),
+                    value.sequence,
+                    value.id,
+                )
+            )
+        )
+        return layers, checksums
+
+    @api.model
+    def _render_layers(self, layers):
+        """Stack the images of the layers, the first one being the background,
+        and return the result as a base64 encoded PNG"""
+        canvas = None
+        for value in layers.with_context(bin_size=False):
+            layer = image_tools.base64_to_image(value.image).convert("RGBA")
+            if canvas is None:
+                canvas = Image.new("RGBA", layer.size)
+            elif layer.size != canvas.size:
+                layer = layer.resize(canvas.size)
+            canvas = Image.alpha_composite(canvas, layer)
+        return image_tools.image_to_base64(canvas, "PNG")
+
+    @api.model
+    def _get_layered_image(self, product_tmpl, value_ids):
+        """Return the image of the configuration composed of the images of
+        its attribute values, rendering and caching it on the first request
+
+        :param product_tmpl: product.template record
+        :param value_ids: list of product.attribute.value ids
+        :returns: product.config.image.cache record, empty if none of the
+                  values has an image
+        """
+        layers, checksums = self._get_layers(product_tmpl, value_ids)
+        if not layers:
+            return self.browse()
+        key = hashlib.sha1(
+            (
+                "%s:%s"
+                % (
+                    product_tmpl.id,
+                    ",".join("%s-%s" % (val.id, checksums[val.id]) for val in layers),
+                )
+            ).encode()
+        ).hexdigest()
+        rendered_image = self.sudo().search([("key", "=", key)], limit=1)
+        if rendered_image:
+            # The last use is only tracked to the hour, a hit does not write
+            # on the image every time it is displayed
+            now = fields.Datetime.now()
+            if rendered_image.last_used < fields.Datetime.subtract(now, hours=1):
+                rendered_image.last_used = now
+            return self.browse(rendered_image.id)
+        vals = {
+            "product_tmpl_id": product_tmpl.id,
+            "key": key,
+            "image_1920": self._render_layers(layers),
+        }
+        try:
+            with self.env.cr.savepoint():
+                rendered_image = self.sudo().create(vals)
+        except IntegrityError as exc:
+            if exc.pgcode != errorcodes.UNIQUE_VIOLATION:
+                raise
+            # Rendered at the same time by another transaction
+            rendered_image = self.sudo().search([("key", "=", key)], limit=1)
+        return self.browse(rendered_image.id)
+
+    @api.model
+    def _cron_evict_cache(self):
+        """Remove the least recently used rendered images beyond the number
+        set by the product_configurator.config_image_cache_size parameter
+
+        Images used within the number of hours set by the
+        product_configurator.config_image_cache_grace_hours parameter are
+        kept, so the urls recently returned to the clients stay valid.
+        """
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        cache_size = int(
+            ICPSudo.get_param("product_configurator.config_image_cache_size", 1000)
+        )
+        grace_hours = int(
+            ICPSudo.get_param("product_configurator.config_image_cache_grace_hours", 24)
+        )
+        date_limit = fields.Datetime.subtract(fields.Datetime.now(), hours=grace_hours)
+        self.flush(["last_used"])
+        self.env.cr.execute(
+            """
+            SELECT id FROM (
+                SELECT id, last_used FROM product_config_image_cache
+                ORDER BY last_used DESC, id DESC
+                OFFSET %s
+            ) AS evictable
+            WHERE last_used < %s
+            """,
+            (cache_size, date_limit),
+        )
+        evicted_ids = [row[0] for row in self.env.cr.fetchall()]
+        if evicted_ids:
+            self.sudo().browse(evicted_ids).unlink()
+            self.env["product.config.session"]._clear_config_memo()
+
+
 class ProductConfigStep(models.Model):
     _name = "product.config.step"
     _description = "Product Config Steps"
@@ -304,6 +734,27 @@ class ProductConfigStepLine(models.Model):
     )
     sequence = fields.Integer(default=10)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductConfigStepLine, self).create(vals_list)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def write(self, vals):
+        """Invalidate the compiled configuration data of the product
+        templates, it holds the steps of the attribute lines"""
+        res = super(ProductConfigStepLine, self).write(vals)
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
+    def unlink(self):
+        res = super(ProductConfigStepLine, self).unlink()
+        self.clear_caches()
+        self.env["product.config.session"]._clear_config_memo()
+        return res
+
     @api.constrains("config_step_id")
     def _check_config_step(self):
         """Prevent to add same step more than once on same product template"""
@@ -322,14 +773,9 @@ class ProductConfigSession(models.Model):
     _name = "product.config.session"
     _description = "Product Config Session"
 
-    @api.depends(
-        "value_ids",
-        "product_tmpl_id.list_price",
-        "product_tmpl_id.attribute_line_ids",
-        "product_tmpl_id.attribute_line_ids.value_ids",
-        "product_tmpl_id.attribute_line_ids.product_template_value_ids",
-        "product_tmpl_id.attribute_line_ids." "product_template_value_ids.price_extra",
-    )
+    # Changes of the template prices are propagated by
+    # _recompute_template_prices() instead of depending on them
+    @api.depends("value_ids", "product_tmpl_id", "custom_value_ids.value")
     def _compute_cfg_price(self):
         for session in self:
             if session.product_tmpl_id:
@@ -337,6 +783,123 @@ class ProductConfigSession(models.Model):
             else:
                 price = 0.00
             session.price = price
+            session.price_version = session.product_tmpl_id.config_price_version
+
+    @api.model
+    def _recompute_template_prices(self, product_tmpl_ids):
+        """Propagate a price change of product templates to the stored price
+        of their configuration sessions
+
+        The price version of the templates is incremented, draft sessions
+        modified within the number of days set by the
+        product_configurator.session_price_sync_days parameter are
+        recomputed in the current transaction. The other sessions are left
+        untouched and recomputed in batches by
+        _cron_recompute_outdated_prices() as their price version is behind.
+
+        :param product_tmpl_ids: list of product.template ids
+        """
+        if not product_tmpl_ids:
+            return
+        product_tmpl_obj = self.env["product.template"]
+        product_tmpl_obj.flush(["config_price_version"])
+        self.env.cr.execute(
+            """
+            UPDATE product_template
+            SET config_price_version = COALESCE(config_price_version, 0) + 1
+            WHERE id IN %s
+            """,
+            (tuple(product_tmpl_ids),),
+        )
+        product_tmpl_obj.invalidate_cache(
+            ["config_price_version"], list(product_tmpl_ids)
+        )
+
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        sync_days = int(
+            ICPSudo.get_param("product_configurator.session_price_sync_days", 30)
+        )
+        date_limit = fields.Datetime.subtract(fields.Datetime.now(), days=sync_days)
+        sessions = self.sudo().search(
+            [
+                ("product_tmpl_id", "in", list(product_tmpl_ids)),
+                ("state", "=", "draft"),
+                ("write_date", ">=", date_limit),
+            ]
+        )
+        sessions._recompute_prices()
+
+    def _recompute_prices(self):
+        """Recompute and store the price of the sessions one at a time
+
+        A session whose price cannot be computed, e.g. with a price rule
+        failing on its custom values, keeps its price and the failure is
+        logged. Its price version is brought up to date anyway, so it is not
+        picked again until the next price change of its template.
+        """
+        price_fields = [self._fields["price"], self._fields["price_version"]]
+        failed_sessions = self.browse()
+        for session in self:
+            try:
+                with self.env.cr.savepoint():
+                    for field in price_fields:
+                        self.env.add_to_compute(field, session)
+                    session.flush(["price", "price_version"], session)
+            except UserError as ex:
+                for field in price_fields:
+                    self.env.remove_to_compute(field, session)
+                session.invalidate_cache(["price", "price_version"], session.ids)
+                _logger.warning(
+                    "Price of configuration session %s not recomputed: %s",
+                    session.id,
+                    ex.args[0],
+                )
+                failed_sessions |= session
+        if failed_sessions:
+            self.env.cr.execute(
+                """
+                UPDATE product_config_session session
+                SET price_version = COALESCE(tmpl.config_price_version, 0)
+                FROM product_template tmpl
+                WHERE tmpl.id = session.product_tmpl_id AND session.id IN %s
+                """,
+                (tuple(failed_sessions.ids),),
+            )
+            failed_sessions.invalidate_cache(["price_version"], failed_sessions.ids)
+
+    @api.model
+    def _cron_recompute_outdated_prices(self):
+        """Recompute the price of the sessions computed with an older price
+        version than their template in batches of the size set by the
+        product_configurator.session_price_recompute_batch parameter,
+        committing after each batch, see _recompute_prices()"""
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        batch_size = int(
+            ICPSudo.get_param(
+                "product_configurator.session_price_recompute_batch", 1000
+            )
+        )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        self.flush(["price_version", "product_tmpl_id"])
+        while True:
+            self.env.cr.execute(
+                """
+                SELECT session.id
+                FROM product_config_session session
+                JOIN product_template tmpl ON tmpl.id = session.product_tmpl_id
+                WHERE COALESCE(session.price_version, 0)
+                    < COALESCE(tmpl.config_price_version, 0)
+                ORDER BY session.id
+                LIMIT %s
+                """,
+                (batch_size,),
+            )
+            session_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not session_ids:
+                break
+            self.sudo().browse(session_ids)._recompute_prices()
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
 
     def get_custom_value_id(self):
         """Return record set of attribute value 'custom'"""
@@ -382,6 +945,30 @@ class ProductConfigSession(models.Model):
             if not session.config_step_name:
                 session.config_step_name = session.config_step
 
+    @api.depends("product_tmpl_id", "value_ids")
+    def _compute_config_fingerprint(self):
+        for session in self:
+            session.config_fingerprint = session.get_config_fingerprint(
+                session.product_tmpl_id.id, session.value_ids.ids
+            )
+
+    @api.model
+    def get_config_fingerprint(self, product_tmpl_id, value_ids):
+        """Return the canonical fingerprint of a configuration, identical
+        for every configuration of the template holding the same values
+
+        :param product_tmpl_id: id of the product.template
+        :param value_ids: list of attribute value ids, the custom value
+                          is not part of the fingerprint
+        :returns: hexadecimal digest of the configuration or False
+        """
+        if not product_tmpl_id:
+            return False
+        custom_value_id = self.get_custom_value_id()
+        value_ids = sorted(set(value_ids) - set(custom_value_id.ids))
+        config_key = "%s:%s" % (product_tmpl_id, ",".join(map(str, value_ids)))
+        return hashlib.sha1(config_key.encode()).hexdigest()
+
     @api.model
     def get_cfg_weight(self, value_ids=None, custom_vals=None):
         """Computes the weight of the configured product based on the
@@ -403,17 +990,27 @@ class ProductConfigSession(models.Model):
 
         value_ids = self.flatten_val_ids(value_ids)
 
-        weight_extra = 0.0
-        product_attr_val_obj = self.env["product.template.attribute.value"]
-        product_tmpl_attr_values = product_attr_val_obj.search(
-            [
-                ("product_tmpl_id", "in", product_tmpl.ids),
-                ("product_attribute_value_id", "in", value_ids),
-            ]
+        memo_key = (
+            "cfg_weight",
+            product_tmpl.id,
+            frozenset(value_ids),
+            self._get_config_memo_custom_key(custom_vals),
+        )
+        return self._config_memoize(
+            memo_key, self._compute_cfg_weight_value, product_tmpl, value_ids
         )
-        for product_tmpl_attr_val in product_tmpl_attr_values:
-            weight_extra += product_tmpl_attr_val.weight_extra
 
+    @api.model
+    def _compute_cfg_weight_value(self, product_tmpl, value_ids):
+        """Return the weight of product_tmpl configured with value_ids"""
+        if not product_tmpl:
+            return 0.0
+        weight_extras = self.env[
+            "product.template.attribute.value"
+        ]._get_template_weight_extras(product_tmpl.id)
+        weight_extra = sum(
+            weight_extras.get(value_id, 0.0) for value_id in set(value_ids)
+        )
         return product_tmpl.weight + weight_extra
 
     @api.depends(
@@ -458,6 +1055,12 @@ class ProductConfigSession(models.Model):
         column1="cfg_session_id",
         column2="attr_val_id",
     )
+    config_fingerprint = fields.Char(
+        compute="_compute_config_fingerprint",
+        store=True,
+        index=True,
+        help="Hash of the template and of the attribute values of the " "configuration",
+    )
     user_id = fields.Many2one(comodel_name="res.users", required=True)
     custom_value_ids = fields.One2many(
         comodel_name="product.config.session.custom.value",
@@ -469,6 +1072,12 @@ class ProductConfigSession(models.Model):
         store=True,
         digits="Product Price",
     )
+    price_version = fields.Integer(
+        compute="_compute_cfg_price",
+        store=True,
+        copy=False,
+        help="Price version of the template the price was computed with",
+    )
     currency_id = fields.Many2one(
         comodel_name="res.currency",
         compute="_compute_currency_id",
@@ -608,13 +1217,20 @@ class ProductConfigSession(models.Model):
             elif isinstance(vals, int):
                 value_ids.append(vals)
 
-        if value_ids != self.value_ids.ids:
-            update_vals.update({"value_ids": [(6, 0, value_ids)]})
+        value_commands = self._get_value_ids_diff_commands(value_ids)
+        if value_commands:
+            update_vals.update({"value_ids": value_commands})
 
-        # Remove all custom values included in the custom_vals dict
-        self.custom_value_ids.filtered(
+        # Replace the custom values that changed, removal is part of the
+        # write so the configuration is validated once the value is gone
+        custom_val_dict = self._get_changed_custom_vals(custom_val_dict)
+        removed_custom_vals = self.custom_value_ids.filtered(
             lambda x: x.attribute_id.id in custom_val_dict.keys()
-        ).unlink()
+        )
+        if removed_custom_vals:
+            update_vals["custom_value_ids"] = [
+                (2, custom_val.id) for custom_val in removed_custom_vals
+            ]
 
         if custom_val_dict:
             binary_field_ids = (
@@ -650,18 +1266,94 @@ class ProductConfigSession(models.Model):
                 custom_vals.update({"value": vals})
 
             update_vals["custom_value_ids"].append((0, 0, custom_vals))
-        self.write(update_vals)
+        if update_vals:
+            self.write(update_vals)
+
+    def _get_value_ids_diff_commands(self, value_ids):
+        """Return the commands turning the value_ids of the session into the
+        given values, only the added and removed values are written instead
+        of replacing every row of the relation
+
+        :param value_ids: list of product.attribute.value ids
+        :returns: list of (3, id) and (4, id) commands, empty if unchanged
+        """
+        self.ensure_one()
+        old_ids = set(self.value_ids.ids)
+        new_ids = set(value_ids)
+        return [(3, val_id) for val_id in sorted(old_ids - new_ids)] + [
+            (4, val_id) for val_id in sorted(new_ids - old_ids)
+        ]
+
+    def _get_changed_custom_vals(self, custom_val_dict):
+        """Filter out of the custom values to write the ones already stored
+        on the session
+
+        :param custom_val_dict: dictionary {attribute_id: custom value}
+        :returns: dictionary holding only the custom values that changed
+        """
+        changed_vals = {}
+        for attr_id, val in custom_val_dict.items():
+            custom_val = self.custom_value_ids.filtered(
+                lambda x, attr_id=attr_id: x.attribute_id.id == attr_id
+            )
+            if not val and not custom_val:
+                continue
+            if (
+                val
+                and not isinstance(val, list)
+                and len(custom_val) == 1
+                and not custom_val.attachment_ids
+                and custom_val.value == str(val)
+            ):
+                continue
+            changed_vals[attr_id] = val
+        return changed_vals
+
+    def _minimize_config_vals(self, vals):
+        """Turn a replacement of the value_ids of a single session into the
+        targeted commands adding and removing values, or drop it when the
+        values did not change"""
+        commands = vals.get("value_ids")
+        if (
+            len(self) != 1
+            or not isinstance(commands, (list, tuple))
+            or len(commands) != 1
+            or commands[0][0] != 6
+        ):
+            return vals
+        vals = dict(vals)
+        value_commands = self._get_value_ids_diff_commands(commands[0][2])
+        if value_commands:
+            vals["value_ids"] = value_commands
+        else:
+            del vals["value_ids"]
+        return vals
 
     def write(self, vals):
         """Validate configuration when writing new values to session"""
         # TODO: Issue warning when writing to value_ids or custom_val_ids
+        vals = self._minimize_config_vals(vals)
+        if not vals:
+            return True
         res = super(ProductConfigSession, self).write(vals)
+        config_changed = any(
+            field in vals for field in ("value_ids", "custom_value_ids")
+        )
+        if config_changed:
+            self._clear_config_memo()
         if not self.product_tmpl_id:
             return res
+        # The stored configuration was validated when it was written
+        if not config_changed and "product_tmpl_id" not in vals:
+            return res
         value_ids = self.value_ids.ids
         avail_val_ids = self.values_available(value_ids)
-        if set(value_ids) - set(avail_val_ids):
-            self.value_ids = [(6, 0, avail_val_ids)]
+        unavailable_ids = set(value_ids) - set(avail_val_ids)
+        if unavailable_ids:
+            super(ProductConfigSession, self).write(
+                {"value_ids": [(3, val_id) for val_id in unavailable_ids]}
+            )
+            self._clear_config_memo()
         try:
             self.validate_configuration(final=False)
         except ValidationError as ex:
@@ -740,7 +1432,17 @@ class ProductConfigSession(models.Model):
         product_obj = (
             self.env["product.product"].sudo().with_context(mail_create_nolog=True)
         )
-        variant = product_obj.sudo().create(vals)
+        # The unique combination index of the variants makes a concurrent
+        # creation of the same variant wait for the other transaction. The
+        # variant it committed is not visible to the snapshot of this one,
+        # the request is replayed to retrieve it
+        try:
+            with self.env.cr.savepoint():
+                variant = product_obj.sudo().create(vals)
+        except IntegrityError as ex:
+            if ex.pgcode != errorcodes.UNIQUE_VIOLATION:
+                raise
+            self._raise_concurrent_variant_creation()
 
         variant.message_post(
             body=_("Product created via configuration wizard"),
@@ -749,6 +1451,263 @@ class ProductConfigSession(models.Model):
 
         return variant
 
+    @api.model
+    def create_get_variants(self, product_tmpl_id, configurations):
+        """Retrieve or create in batch the variants of many configurations
+        of the same product template
+
+        Every configuration is validated against the restrictions compiled
+        once for the template, existing variants are resolved with a single
+        search and the missing ones are created with a single create()
+        without chatter messages.
+
+        :param product_tmpl_id: id of the product.template
+        :param configurations: list of lists of product.attribute.value ids
+        :returns: dictionary of the form {
+            'variants': {row index: product.product id},
+            'errors': {row index: error message},
+        }
+        """
+        product_tmpl = self.env["product.template"].browse(product_tmpl_id)
+        product_tmpl.ensure_one()
+
+        variants = {}
+        errors = {}
+        row_fingerprints = {}
+        fingerprint_values = {}
+        for row, value_ids in enumerate(configurations):
+            value_ids = self.flatten_val_ids(value_ids)
+            session = self.new(
+                {"product_tmpl_id": product_tmpl.id, "value_ids": [(6, 0, value_ids)]}
+            )
+            try:
+                session.validate_configuration(value_ids=value_ids, custom_vals={})
+            except (ValidationError, UserError) as ex:
+                errors[row] = ex.args[0]
+                continue
+            fingerprint = self.get_config_fingerprint(product_tmpl.id, value_ids)
+            row_fingerprints[row] = fingerprint
+            fingerprint_values.setdefault(fingerprint, value_ids)
+
+        existing_variants = (
+            self.env["product.product"]
+            .sudo()
+            .search(
+                [
+                    ("product_tmpl_id", "=", product_tmpl.id),
+                    ("config_ok", "=", True),
+                    ("config_fingerprint", "in", list(fingerprint_values)),
+                ]
+            )
+        )
+        fingerprint_variants = {}
+        for variant in existing_variants:
+            fingerprint_variants.setdefault(variant.config_fingerprint, variant.id)
+
+        missing_values = {
+            fingerprint: value_ids
+            for fingerprint, value_ids in fingerprint_values.items()
+            if fingerprint not in fingerprint_variants
+        }
+        if missing_values:
+            new_variants = self._create_config_variants(product_tmpl, missing_values)
+            for variant in new_variants:
+                fingerprint_variants[variant.config_fingerprint] = variant.id
+
+        for row, fingerprint in row_fingerprints.items():
+            variants[row] = fingerprint_variants[fingerprint]
+        return {"variants": variants, "errors": errors}
+
+    @api.model
+    def _create_config_variants(self, product_tmpl, fingerprint_values):
+        """Create the variants of many configurations with a single create(),
+        see create_get_variants
+
+        :param product_tmpl: product.template record
+        :param fingerprint_values: {fingerprint: list of attribute value ids}
+        :returns: product.product recordset of the created variants, or of
+                  the existing ones for the configurations created meanwhile
+                  by another transaction
+        """
+        all_value_ids = {
+            val_id for value_ids in fingerprint_values.values() for val_id in value_ids
+        }
+        ptavs = self.env["product.template.attribute.value"].search(
+            [
+                ("product_tmpl_id", "=", product_tmpl.id),
+                ("product_attribute_value_id", "in", list(all_value_ids)),
+                ("ptav_active", "=", True),
+            ]
+        )
+        value_ptavs = {ptav.product_attribute_value_id.id: ptav.id for ptav in ptavs}
+        vals_list = []
+        for value_ids in fingerprint_values.values():
+            session = self.new(
+                {"product_tmpl_id": product_tmpl.id, "value_ids": [(6, 0, value_ids)]}
+            )
+            ptav_ids = [
+                value_ptavs[val_id] for val_id in value_ids if val_id in value_ptavs
+            ]
+            vals_list.append(session.get_variant_vals(value_ids, {}, ptav_ids=ptav_ids))
+
+        product_obj = (
+            self.env["product.product"]
+            .sudo()
+            .with_context(mail_create_nolog=True, tracking_disable=True)
+        )
+        try:
+            with self.env.cr.savepoint():
+                return product_obj.create(vals_list)
+        except IntegrityError as ex:
+            if ex.pgcode != errorcodes.UNIQUE_VIOLATION:
+                raise
+        # Another transaction created some of the configurations, create the
+        # others one by one and retrieve the existing ones. Those committed
+        # after the snapshot of this transaction are retrieved by a replay
+        variants = product_obj.browse()
+        for value_ids, vals in zip(fingerprint_values.values(), vals_list):
+            try:
+                with self.env.cr.savepoint():
+                    variants |= product_obj.create(vals)
+            except IntegrityError as ex:
+                if ex.pgcode != errorcodes.UNIQUE_VIOLATION:
+                    raise
+                duplicates = self.search_variant(
+                    value_ids=value_ids, product_tmpl_id=product_tmpl
+                )
+                if not duplicates:
+                    self._raise_concurrent_variant_creation()
+                variants |= duplicates[:1]
+        return variants
+
+    @api.model
+    def _raise_concurrent_variant_creation(self):
+        """Abort the transaction with a serialization failure when a variant
+        was committed by another transaction after the snapshot of this one
+
+        The conflicting variant cannot be retrieved by this transaction, the
+        serialization failure makes odoo.service.model.retrying replay the
+        request in a new transaction which finds it.
+        """
+        self.env.cr.execute(
+            """
+            DO $$ BEGIN
+                RAISE EXCEPTION 'Configured variant created concurrently'
+                USING ERRCODE = 'serialization_failure';
+            END $$
+            """,
+            log_exceptions=False,
+        )
+
+    @api.model
+    def configure_many(self, items, chunk_size=None):
+        """Configure many products in a single call for integrations, instead
+        of driving the configuration wizard step by step
+
+        Every item gets its own configuration session which is validated and
+        confirmed, creating or retrieving the variant, and optionally a line
+        on the target document (see _configure_target). Items failing
+        validation are rolled back individually and reported. Unless running
+        tests, the transaction is committed after every chunk of items.
+
+        :param items: list of dictionaries of the form {
+            'product_tmpl_id': id of the product.template,
+            'value_ids': list of product.attribute.value ids,
+            'custom_vals': optional dictionary {attribute_id: custom_value},
+            'target': optional dictionary {'model': ..., 'res_id': ...}
+                      describing the document to add a line to,
+        }
+        :param chunk_size: number of items per transaction, the
+                           product_configurator.configure_many_chunk_size
+                           parameter by default
+        :returns: list of dictionaries, in the order of the items, of the form
+                  {'session_id': ..., 'product_id': ..., 'line_id': ...,
+                   'error': error message or False}
+        """
+        if not chunk_size:
+            ICPSudo = self.env["ir.config_parameter"].sudo()
+            chunk_size = int(
+                ICPSudo.get_param("product_configurator.configure_many_chunk_size", 100)
+            )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        results = []
+        for start in range(0, len(items), chunk_size):
+            for item in items[start : start + chunk_size]:
+                try:
+                    with self.env.cr.savepoint():
+                        results.append(self._configure_item(item))
+                except (UserError, ValidationError, OperationalError) as ex:
+                    # The chunks already committed must not be replayed, a
+                    # variant created concurrently is reported on its item
+                    if (
+                        isinstance(ex, OperationalError)
+                        and ex.pgcode != errorcodes.SERIALIZATION_FAILURE
+                    ):
+                        raise
+                    # Drop the results computed from the rolled back records
+                    self._clear_config_memo()
+                    if isinstance(ex, OperationalError):
+                        error = _(
+                            "The configuration was created at the same time "
+                            "by another transaction, please try again"
+                        )
+                    else:
+                        error = ex.args[0]
+                    results.append(
+                        {
+                            "session_id": False,
+                            "product_id": False,
+                            "line_id": False,
+                            "error": error,
+                        }
+                    )
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+        return results
+
+    @api.model
+    def _configure_item(self, item):
+        """Configure and confirm the session of one item of configure_many"""
+        product_tmpl = self.env["product.template"].browse(item["product_tmpl_id"])
+        if not product_tmpl.exists() or not product_tmpl.config_ok:
+            raise UserError(
+                _("Product template %s is not configurable") % item["product_tmpl_id"]
+            )
+        custom_vals = {
+            int(attr_id): val
+            for attr_id, val in (item.get("custom_vals") or {}).items()
+        }
+        vals = self.get_session_vals(product_tmpl.id)
+        vals.update(
+            {
+                "value_ids": [
+                    (6, 0, self.flatten_val_ids(item.get("value_ids") or []))
+                ],
+                "custom_value_ids": self.encode_custom_values(custom_vals),
+            }
+        )
+        session = self.create(vals)
+        session.action_confirm()
+        line_id = False
+        if item.get("target"):
+            line_id = session._configure_target(item["target"]).id
+        return {
+            "session_id": session.id,
+            "product_id": session.product_id.id,
+            "line_id": line_id,
+            "error": False,
+        }
+
+    def _configure_target(self, target):
+        """Hook to add the configured variant of the session to the document
+        described by target, overridden by the modules integrating the
+        configurator with documents
+
+        :param target: dictionary {'model': ..., 'res_id': ...}
+        :returns: the created line
+        """
+        raise UserError(_("Unsupported configuration target %s") % target.get("model"))
+
     def _get_option_values(self, pricelist, value_ids=None):
         """Return only attribute values that have products attached with a
         price set to them"""
@@ -765,31 +1724,38 @@ class ProductConfigSession(models.Model):
 
     def get_components_prices(self, prices, pricelist, value_ids=None):
         """Return prices of the components which make up the final
-        configured variant"""
+        configured variant
+
+        The prices of all the components are computed at once for the
+        pricelist and the taxes once per set of taxes and price"""
         if value_ids is None:
             value_ids = self.value_ids.ids
         vals = self._get_option_values(pricelist, value_ids)
+        # product.price evaluates the pricelist rules of the whole recordset
+        # in a single call
+        products = vals.mapped("product_id").with_context(pricelist=pricelist.id)
+        product_prices = dict(zip(products.ids, products.mapped("price")))
+        tax_groups = {}
         for val in vals:
-            prices["vals"].append(
-                (
-                    val.attribute_id.name,
-                    val.product_id.name,
-                    val.product_id.price,
+            price = product_prices[val.product_id.id]
+            prices["vals"].append((val.attribute_id.name, val.product_id.name, price))
+            price_counts = tax_groups.setdefault(val.product_id.taxes_id, {})
+            price_counts[price] = price_counts.get(price, 0) + 1
+
+        partner = self.env.user.partner_id
+        for taxes, price_counts in tax_groups.items():
+            for price, count in price_counts.items():
+                tax_prices = taxes.sudo().compute_all(
+                    price_unit=price,
+                    currency=pricelist.currency_id,
+                    quantity=1,
+                    product=self,
+                    partner=partner,
                 )
-            )
-            product = val.product_id.with_context(pricelist=pricelist.id)
-            product_prices = product.taxes_id.sudo().compute_all(
-                price_unit=product.price,
-                currency=pricelist.currency_id,
-                quantity=1,
-                product=self,
-                partner=self.env.user.partner_id,
-            )
-
-            total_included = product_prices["total_included"]
-            taxes = total_included - product_prices["total_excluded"]
-            prices["taxes"] += taxes
-            prices["total"] += total_included
+                total_included = tax_prices["total_included"]
+                taxes_amount = total_included - tax_prices["total_excluded"]
+                prices["taxes"] += taxes_amount * count
+                prices["total"] += total_included * count
         return prices
 
     @api.model
@@ -805,13 +1771,33 @@ class ProductConfigSession(models.Model):
             value_ids = self.value_ids.ids
 
         if custom_vals is None:
-            custom_vals = {}
+            custom_vals = self._get_custom_vals_dict()
 
         product_tmpl = self.product_tmpl_id
         self = self.with_context(active_id=product_tmpl.id)
 
         value_ids = self.flatten_val_ids(value_ids)
 
+        memo_key = (
+            "cfg_price",
+            product_tmpl.id,
+            frozenset(value_ids),
+            self._get_config_memo_custom_key(custom_vals),
+            self.env.uid,
+            self.env["product.attribute.value"]._get_extra_prices_key(),
+        )
+        return self._config_memoize(
+            memo_key,
+            self._compute_cfg_price_value,
+            product_tmpl,
+            value_ids,
+            custom_vals,
+        )
+
+    @api.model
+    def _compute_cfg_price_value(self, product_tmpl, value_ids, custom_vals=None):
+        """Return the price of product_tmpl configured with value_ids and
+        custom_vals, the price rules of the template are applied last"""
         price_extra = 0.0
         attr_val_obj = self.env["product.attribute.value"]
         av_ids = attr_val_obj.browse(value_ids)
@@ -819,7 +1805,10 @@ class ProductConfigSession(models.Model):
             product_tmpl_id=product_tmpl.id, pt_attr_value_ids=av_ids
         )
         price_extra = sum(extra_prices.values())
-        return product_tmpl.list_price + price_extra
+        price = product_tmpl.list_price + price_extra
+        return price + self.env["product.config.price.rule"]._get_price_rules_extra(
+            product_tmpl.id, value_ids, custom_vals or {}, price
+        )
 
     def _get_config_image(self, value_ids=None, custom_vals=None, size=None):
         """
@@ -839,15 +1828,54 @@ class ProductConfigSession(models.Model):
         if custom_vals is None:
             custom_vals = self._get_custom_vals_dict()
 
-        img_obj = self.product_tmpl_id
-        max_matches = 0
         value_ids = self.flatten_val_ids(value_ids)
-        for line in self.product_tmpl_id.config_image_ids:
-            matches = len(set(line.value_ids.ids) & set(value_ids))
-            if matches > max_matches:
-                img_obj = line
-                max_matches = matches
-        return img_obj
+        memo_key = (
+            "config_image",
+            self.product_tmpl_id.id,
+            frozenset(value_ids),
+            self._get_config_memo_custom_key(custom_vals),
+        )
+        img_model, img_id = self._config_memoize(
+            memo_key, self._compute_config_image, value_ids
+        )
+        image = self.env[img_model].browse(img_id)
+        if img_model == "product.config.image.cache" and not image.exists():
+            # Rendered image evicted or rolled back since it was memoized
+            self._clear_config_memo()
+            img_model, img_id = self._config_memoize(
+                memo_key, self._compute_config_image, value_ids
+            )
+            image = self.env[img_model].browse(img_id)
+        return image
+
+    def _compute_config_image(self, value_ids):
+        """Return the model and id of the image object matching value_ids,
+        see _get_config_image"""
+        if not self.product_tmpl_id:
+            return self.product_tmpl_id._name, self.product_tmpl_id.id
+        if self.product_tmpl_id.config_image_mode == "layers":
+            rendered_image = self.env["product.config.image.cache"]._get_layered_image(
+                self.product_tmpl_id, set(value_ids)
+            )
+            if rendered_image:
+                return rendered_image._name, rendered_image.id
+            return self.product_tmpl_id._name, self.product_tmpl_id.id
+        config_image_index = self.env["product.config.image"]._get_config_image_index(
+            self.product_tmpl_id.id
+        )
+        # Count the matching values of the images sharing at least one value
+        # with the configuration, ties go to the first image in sequence
+        matches = {}
+        for value_id in set(value_ids):
+            for image_id in config_image_index["value_images"].get(value_id, ()):
+                matches[image_id] = matches.get(image_id, 0) + 1
+        if not matches:
+            return self.product_tmpl_id._name, self.product_tmpl_id.id
+        positions = config_image_index["positions"]
+        image_id = max(
+            matches, key=lambda img_id: (matches[img_id], -positions[img_id])
+        )
+        return "product.config.image", image_id
 
     def get_config_image(self, value_ids=None, custom_vals=None, size=None):
         """
@@ -858,7 +1886,152 @@ class ProductConfigSession(models.Model):
         config_image_id = self._get_config_image(
             value_ids=value_ids, custom_vals=custom_vals
         )
-        return config_image_id.image_1920
+        return config_image_id[self._get_config_image_field(size)]
+
+    @api.model
+    def _get_config_image_field(self, size=None):
+        """Return the name of the smallest image field of image.mixin that is
+        at least as large as the requested size (image_1920 by default)"""
+        if size:
+            for image_size in CONFIG_IMAGE_SIZES:
+                if image_size >= int(size):
+                    return "image_%s" % image_size
+        return "image_1920"
+
+    def get_config_image_url(self, value_ids=None, custom_vals=None, size=None):
+        """Return the /web/image url of the image matching the configuration
+        so that clients can load (and cache) it instead of receiving the
+        image data itself
+
+        The url points to the image field of the requested size and carries
+        the checksum of the stored image, it changes whenever the image does
+
+        :returns: url of the image or False if the matched record has no image
+        """
+        config_image_id = self._get_config_image(
+            value_ids=value_ids, custom_vals=custom_vals
+        )
+        if not config_image_id:
+            return False
+        field_name = self._get_config_image_field(size)
+        attachment = (
+            self.env["ir.attachment"]
+            .sudo()
+            .search(
+                [
+                    ("res_model", "=", config_image_id._name),
+                    ("res_field", "=", field_name),
+                    ("res_id", "=", config_image_id.id),
+                ],
+                limit=1,
+            )
+        )
+        if not attachment:
+            return False
+        return "/web/image/%s/%s/%s?unique=%s" % (
+            config_image_id._name,
+            config_image_id.id,
+            field_name,
+            attachment.checksum,
+        )
+
+    def apply_config_delta(self, delta, image_size=None):
+        """Apply a change of the selected values of some attributes to the
+        session and return what a client needs to refresh, without going
+        through the onchange of the configuration wizard
+
+        Only the availability of the attributes depending on the changed
+        ones is evaluated and returned, the selected values that are not
+        available anymore are removed from the configuration like the wizard
+        does. Only the draft sessions of the current user can be changed.
+
+        :param delta: dictionary {attribute_id: value_id, list of value ids
+                      or False to clear the attribute}
+        :param image_size: size of the configuration image, see
+                           get_config_image_url
+        :returns: dictionary of the form {
+            'value_ids': list of the selected attribute value ids,
+            'availability': {attribute_id: list of available value ids},
+            'price': price of the configuration,
+            'weight': weight of the configuration,
+            'image': url of the configuration image,
+        }
+        """
+        self.ensure_one()
+        if self.user_id != self.env.user and not self.env.su:
+            raise AccessError(
+                _("You are not allowed to change the configuration of another user")
+            )
+        if self.state != "draft":
+            raise UserError(_("Only draft configurations can be changed"))
+        # Keys are strings once sent through JSON
+        delta = {int(attr_id): vals for attr_id, vals in delta.items()}
+        product_tmpl = self.product_tmpl_id
+        attr_lines = product_tmpl.attribute_line_ids.sorted()
+        custom_val_id = self.get_custom_value_id().id
+
+        attr_line_by_attr = {line.attribute_id.id: line for line in attr_lines}
+        value_ids = self.value_ids.filtered(
+            lambda val: val.attribute_id.id not in delta
+        ).ids
+        for attr_id, vals in delta.items():
+            if not vals:
+                continue
+            vals = vals if isinstance(vals, list) else [vals]
+            attr_line = attr_line_by_attr.get(
+                attr_id, self.env["product.template.attribute.line"]
+            )
+            allowed_val_ids = set(attr_line.value_ids.ids)
+            if attr_line.custom:
+                allowed_val_ids.add(custom_val_id)
+            if not attr_line or not set(vals) <= allowed_val_ids:
+                raise UserError(
+                    _(
+                        "Invalid values for attribute %(attribute_id)s on "
+                        "product %(product_name)s"
+                    )
+                    % {
+                        "attribute_id": attr_id,
+                        "product_name": product_tmpl.display_name,
+                    }
+                )
+            value_ids += vals
+
+        recompute_attr_ids = self._get_config_dependent_attrs(
+            product_tmpl.id, delta.keys()
+        )
+        availability = {}
+        check_avail_ids = value_ids[:]
+        # The availability of the other attributes is not affected
+        check_attr_ids = recompute_attr_ids | set(delta)
+        for line in attr_lines:
+            if line.attribute_id.id not in check_attr_ids:
+                continue
+            avail_ids = self.values_available(
+                check_val_ids=line.value_ids.ids, value_ids=check_avail_ids
+            )
+            check_avail_ids = list(
+                set(check_avail_ids) - (set(line.value_ids.ids) - set(avail_ids))
+            )
+            if line.attribute_id.id in recompute_attr_ids:
+                if line.custom:
+                    avail_ids.append(custom_val_id)
+                availability[line.attribute_id.id] = avail_ids
+
+        check_avail_ids = set(check_avail_ids)
+        value_ids = [
+            val_id
+            for val_id in value_ids
+            if val_id in check_avail_ids or val_id == custom_val_id
+        ]
+        self.write({"value_ids": [(6, 0, value_ids)]})
+        return {
+            "value_ids": value_ids,
+            "availability": availability,
+            "price": self.get_cfg_price(value_ids),
+            "weight": self.get_cfg_weight(value_ids=value_ids),
+            "image": self.get_config_image_url(value_ids, size=image_size),
+        }
 
     @api.model
     def get_variant_vals(self, value_ids=None, custom_vals=None, **kwargs):
@@ -866,6 +2039,8 @@ class ProductConfigSession(models.Model):
 
         :param value_ids: list of product.attribute.values ids
         :param custom_vals: dict {product.attribute.id: custom_value}
+        :param ptav_ids: optional list of the product.template.attribute.value
+                         ids of value_ids when already known by the caller
 
         :returns: dictionary of values to pass to product.create() method
         """
@@ -877,20 +2052,33 @@ class ProductConfigSession(models.Model):
         if custom_vals is None:
             custom_vals = self._get_custom_vals_dict()
 
-        image = self.get_config_image(value_ids)
-        ptav_ids = self.env["product.template.attribute.value"].search(
-            [
-                ("product_tmpl_id", "=", self.product_tmpl_id.id),
-                ("product_attribute_value_id", "in", value_ids),
-                ("ptav_active", "=", True),
-            ]
-        )
+        config_image = self._get_config_image(value_ids, custom_vals=custom_vals)
+        ptav_ids = kwargs.get("ptav_ids")
+        if ptav_ids is None:
+            ptav_ids = (
+                self.env["product.template.attribute.value"]
+                .search(
+                    [
+                        ("product_tmpl_id", "=", self.product_tmpl_id.id),
+                        ("product_attribute_value_id", "in", value_ids),
+                        ("ptav_active", "=", True),
+                    ]
+                )
+                .ids
+            )
         vals = {
             "product_tmpl_id": self.product_tmpl_id.id,
-            "product_template_attribute_value_ids": [(6, 0, ptav_ids.ids)],
+            "product_template_attribute_value_ids": [(6, 0, ptav_ids)],
             "taxes_id": [(6, 0, self.product_tmpl_id.taxes_id.ids)],
-            "image_1920": image,
         }
+        # Variants reference the matched configuration image instead of
+        # storing (and resizing) a copy of it, template images are shown
+        # by default on variants without image
+        if config_image._name == "product.config.image":
+            vals["config_image_id"] = config_image.id
+        elif config_image._name == "product.config.image.cache":
+            # Rendered images are evicted from the cache, keep a copy
+            vals["image_1920"] = config_image.image_1920
         return vals
 
     def get_session_search_domain(self, product_tmpl_id, state="draft", parent_id=None):
@@ -1013,19 +2201,33 @@ class ProductConfigSession(models.Model):
         if value_ids is None:
             value_ids = self.value_ids.ids
 
+        memo_key = ("open_step_lines", self.product_tmpl_id.id, frozenset(value_ids))
+        open_step_line_ids = self._config_memoize(
+            memo_key, self._compute_open_step_lines, value_ids
+        )
+        return self.env["product.config.step.line"].browse(open_step_line_ids)
+
+    def _compute_open_step_lines(self, value_ids):
+        """Return the ids of the configuration step lines open for access,
+        see get_open_step_lines"""
         open_step_lines = self.env["product.config.step.line"]
+        lines_avail = self._get_attr_lines_availability(
+            self.product_tmpl_id.id, value_ids
+        )
 
         for cfg_line in self.product_tmpl_id.config_step_line_ids:
             for attr_line in cfg_line.attribute_line_ids:
-                available_vals = self.values_available(
-                    attr_line.value_ids.ids, value_ids
-                )
+                available_vals = lines_avail.get(attr_line.id)
+                if available_vals is None:
+                    available_vals = self.values_available(
+                        attr_line.value_ids.ids, value_ids
+                    )
                 # TODO: Refactor when adding restriction to custom values
                 if available_vals or attr_line.custom:
                     open_step_lines |= cfg_line
                     break
 
-        return open_step_lines.sorted()
+        return tuple(open_step_lines.sorted().ids)
 
     @api.model
     def get_all_step_lines(self, product_tmpl_id=None):
@@ -1124,18 +2326,16 @@ class ProductConfigSession(models.Model):
         if value_ids is None:
             value_ids = self.value_ids.ids
 
+        # Variants holding exactly the same values share the fingerprint
         domain = [
             ("product_tmpl_id", "=", product_tmpl_id.id),
             ("config_ok", "=", True),
+            (
+                "config_fingerprint",
+                "=",
+                self.get_config_fingerprint(product_tmpl_id.id, value_ids),
+            ),
         ]
-        pta_value_ids = self.env["product.template.attribute.value"].search(
-            [
-                ("product_tmpl_id", "=", product_tmpl_id.id),
-                ("product_attribute_value_id", "in", value_ids),
-            ]
-        )
-        for value_id in pta_value_ids:
-            domain.append(("product_template_attribute_value_ids", "=", value_id.id))
         return domain
 
     def validate_domains_against_sels(self, domains, value_ids=None, custom_vals=None):
@@ -1175,6 +2375,261 @@ class ProductConfigSession(models.Model):
             avail &= stack.pop()
         return avail
 
+    @api.model
+    @tools.ormcache("product_tmpl_id")
+    def _get_config_restrictions(self, product_tmpl_id):
+        """Compile the restrictions set via the config lines of a product
+        template once so availability can be evaluated without walking the
+        config lines, domains and domain lines on every call.
+
+        Every attribute value used in a restriction is mapped to a bit
+        position so a configuration is represented by a single integer and
+        each operand is evaluated with one bitwise and.
+
+        The cache is cleared whenever a config line, a restriction, a
+        restriction line, a configuration step line or an attribute line is
+        created, modified or removed.
+
+        :param product_tmpl_id: id of the product.template
+        :returns: dictionary of the form {
+            'bits': {attribute_value_id: bit position},
+            'restrictions': tuple of restrictions in polish notation holding
+                            '|' operators and (mask, is_in) operands,
+            'value_restrictions': {attribute_value_id: restriction index},
+            'dependents': {attribute_id: frozenset(attribute_ids)} of the
+                          attributes restricted by each attribute,
+            'config_lines': {config_line_id: (attribute_line_id, domain_id,
+                             frozenset(attribute_value_ids))},
+            'value_config_lines': {attribute_value_id: config_line_ids}
+                                  of the config lines restricting a value,
+            'attr_line_config_lines': {attribute_line_id: config_line_ids},
+            'domains': {domain_id: {
+                'lines': ((attribute_id, condition, attribute_value_ids),),
+                'attr_ids': frozenset(attribute_ids),
+                'value_ids': frozenset(attribute_value_ids),
+            }} of the restriction lines defined on each restriction,
+            'attr_line_steps': {attribute_line_id: config_step_line_ids}
+                               of the configuration steps of each line,
+            'attr_line_depends': {attribute_line_id: {
+                attribute_id: frozenset(attribute_value_ids)
+            }} of the values of the dependee attributes enabling the
+               attribute lines whose values are all restricted,
+            'version': digest identifying the compiled restrictions,
+        }
+        """
+        product_tmpl = self.env["product.template"].sudo().browse(product_tmpl_id)
+        bits = {}
+        compiled_domains = {}
+        domain_attr_ids = {}
+        value_domain_ids = {}
+        dependents = {}
+        config_lines = {}
+        value_config_lines = {}
+        attr_line_config_lines = {}
+        domains = {}
+        for config_line in product_tmpl.config_line_ids:
+            domain = config_line.domain_id
+            attr_line_id = config_line.attribute_line_id.id
+            config_lines[config_line.id] = (
+                attr_line_id,
+                domain.id,
+                frozenset(config_line.value_ids.ids),
+            )
+            attr_line_config_lines.setdefault(attr_line_id, []).append(config_line.id)
+            if domain.id not in compiled_domains:
+                domain_lines = tuple(
+                    (line.attribute_id.id, line.condition, tuple(line.value_ids.ids))
+                    for line in domain.domain_line_ids
+                )
+                domains[domain.id] = {
+                    "lines": domain_lines,
+                    "attr_ids": frozenset(line[0] for line in domain_lines),
+                    "value_ids": frozenset(
+                        val_id for line in domain_lines for val_id in line[2]
+                    ),
+                }
+                compiled_domain = []
+                domain_attr_ids[domain.id] = set()
+                for operand in domain.compute_domain():
+                    if not isinstance(operand, tuple):
+                        compiled_domain.append(operand)
+                        continue
+                    mask = 0
+                    for attr_val_id in operand[2]:
+                        mask |= 1 << bits.setdefault(attr_val_id, len(bits))
+                    compiled_domain.append((mask, operand[1] == "in"))
+                    domain_attr_ids[domain.id].add(operand[0])
+                compiled_domains[domain.id] = tuple(compiled_domain)
+            attr_id = config_line.attribute_line_id.attribute_id.id
+            for dependee_attr_id in domain_attr_ids[domain.id]:
+                dependents.setdefault(dependee_attr_id, set()).add(attr_id)
+            for attr_val_id in config_line.value_ids.ids:
+                value_config_lines.setdefault(attr_val_id, []).append(config_line.id)
+                domain_ids = value_domain_ids.setdefault(attr_val_id, [])
+                if domain.id not in domain_ids:
+                    domain_ids.append(domain.id)
+
+        # Values governed by the same set of restrictions share the
+        # compiled restriction so it is evaluated only once per pass
+        restrictions = {}
+        value_restrictions = {}
+        for attr_val_id, domain_ids in value_domain_ids.items():
+            restriction = tuple(
+                operand
+                for domain_id in domain_ids
+                for operand in compiled_domains[domain_id]
+            )
+            value_restrictions[attr_val_id] = restrictions.setdefault(
+                restriction, len(restrictions)
+            )
+        restrictions = tuple(restrictions)
+        dependents = {
+            attr_id: frozenset(attr_ids) for attr_id, attr_ids in dependents.items()
+        }
+        # The client keeps the domains computed for a version, every map
+        # they are derived from and the values of the attribute lines are
+        # part of it
+        attr_line_values = sorted(
+            (line.id, line.attribute_id.id, sorted(line.value_ids.ids))
+            for line in product_tmpl.attribute_line_ids
+        )
+        version = hashlib.sha1(
+            repr(
+                (
+                    sorted(bits.items()),
+                    restrictions,
+                    sorted(value_restrictions.items()),
+                    sorted(
+                        (attr_id, sorted(attr_ids))
+                        for attr_id, attr_ids in dependents.items()
+                    ),
+                    sorted(
+                        (line_id, line[0], line[1], sorted(line[2]))
+                        for line_id, line in config_lines.items()
+                    ),
+                    attr_line_values,
+                )
+            ).encode()
+        ).hexdigest()
+
+        attr_line_steps = {}
+        for step_line in product_tmpl.config_step_line_ids:
+            for attr_line_id in step_line.attribute_line_ids.ids:
+                attr_line_steps.setdefault(attr_line_id, []).append(step_line.id)
+        return {
+            "bits": bits,
+            "restrictions": restrictions,
+            "value_restrictions": value_restrictions,
+            "dependents": dependents,
+            "config_lines": config_lines,
+            "value_config_lines": {
+                attr_val_id: tuple(line_ids)
+                for attr_val_id, line_ids in value_config_lines.items()
+            },
+            "attr_line_config_lines": {
+                attr_line_id: tuple(line_ids)
+                for attr_line_id, line_ids in attr_line_config_lines.items()
+            },
+            "domains": domains,
+            "attr_line_steps": {
+                attr_line_id: tuple(step_line_ids)
+                for attr_line_id, step_line_ids in attr_line_steps.items()
+            },
+            "attr_line_depends": self._get_config_attr_line_depends(
+                product_tmpl, config_lines, attr_line_config_lines, domains
+            ),
+            "version": version,
+        }
+
+    @api.model
+    def _get_config_attr_line_depends(
+        self, product_tmpl, config_lines, attr_line_config_lines, domains
+    ):
+        """Return the values of the dependee attributes enabling the
+        attribute lines of product_tmpl whose values are all restricted by
+        config lines, see _get_config_restrictions"""
+        attr_line_values = {}
+        attr_values = {}
+        for attr_line in product_tmpl.attribute_line_ids:
+            attr_line_values[attr_line.id] = set(attr_line.value_ids.ids)
+            attr_values.setdefault(attr_line.attribute_id.id, set()).update(
+                attr_line.value_ids.ids
+            )
+
+        attr_line_depends = {}
+        for attr_line_id, config_line_ids in attr_line_config_lines.items():
+            dependency_value_ids = set()
+            for config_line_id in config_line_ids:
+                dependency_value_ids |= config_lines[config_line_id][2]
+            if not attr_line_values.get(attr_line_id, set()) <= dependency_value_ids:
+                continue
+            attr_depends = {}
+            domain_ids = dict.fromkeys(
+                config_lines[config_line_id][1] for config_line_id in config_line_ids
+            )
+            for domain_id in domain_ids:
+                for attr_id, condition, value_ids in domains[domain_id]["lines"]:
+                    depends = attr_depends.setdefault(attr_id, set())
+                    if condition == "in":
+                        depends |= set(value_ids)
+                    elif condition == "not in":
+                        depends |= attr_values.get(attr_id, set()) - set(value_ids)
+            attr_line_depends[attr_line_id] = {
+                attr_id: frozenset(value_ids)
+                for attr_id, value_ids in attr_depends.items()
+            }
+        return attr_line_depends
+
+    @api.model
+    def _get_config_dependent_attrs(self, product_tmpl_id, attr_ids):
+        """Return the ids of the attributes whose availability depends,
+        directly or through other attributes, on the attributes passed
+
+        :param product_tmpl_id: id of the product.template
+        :param attr_ids: iterable of product.attribute ids that changed
+        :returns: set of product.attribute ids to re-evaluate
+        """
+        dependents = self._get_config_restrictions(product_tmpl_id)["dependents"]
+        dependent_attr_ids = set()
+        todo = list(attr_ids)
+        while todo:
+            for attr_id in dependents.get(todo.pop(), ()):
+                if attr_id not in dependent_attr_ids:
+                    dependent_attr_ids.add(attr_id)
+                    todo.append(attr_id)
+        return dependent_attr_ids
+
+    @api.model
+    def _get_config_mask(self, config_restrictions, value_ids):
+        """Return the bitmask representing value_ids in the bit positions
+        of the compiled restrictions returned by _get_config_restrictions"""
+        bits = config_restrictions["bits"]
+        mask = 0
+        for attr_val_id in value_ids:
+            if attr_val_id in bits:
+                mask |= 1 << bits[attr_val_id]
+        return mask
+
+    @api.model
+    def _eval_config_restriction(self, restriction, mask):
+        """Evaluate a restriction compiled by _get_config_restrictions
+        against a configuration, same as validate_domains_against_sels
+
+        :param restriction: compiled restriction in polish notation
+        :param mask: bitmask of the selected attribute values
+        :returns: True if the restriction is satisfied
+        """
+        stack = []
+        for operand in reversed(restriction):
+            if isinstance(operand, tuple):
+                stack.append(bool(operand[0] & mask) is operand[1])
+            else:
+                # Only 'or' operators are compiled, 'and' is implied
+                operand1 = stack.pop()
+                operand2 = stack.pop()
+                stack.append(operand1 or operand2)
+        return all(stack)
+
     @api.model
     def values_available(
         self,
@@ -1196,8 +2651,6 @@ class ProductConfigSession(models.Model):
         """
         if check_val_ids is None:
             check_val_ids = self.value_ids.ids
-        elif check_val_ids:
-            check_val_ids = check_val_ids.copy()
         if not self.product_tmpl_id:
             product_tmpl = self.env["product.template"].browse(product_tmpl_id)
         else:
@@ -1207,25 +2660,113 @@ class ProductConfigSession(models.Model):
 
         if value_ids is None:
             value_ids = self.value_ids.ids
-        elif value_ids:
-            value_ids = value_ids.copy()
 
-        if custom_vals is None:
-            custom_vals = self._get_custom_vals_dict()
+        memo_key = (
+            "values_available",
+            product_tmpl.id,
+            tuple(check_val_ids),
+            frozenset(value_ids or []),
+        )
+        return list(
+            self._config_memoize(
+                memo_key,
+                self._compute_values_available,
+                product_tmpl.id,
+                check_val_ids,
+                value_ids,
+            )
+        )
 
+    @api.model
+    def _compute_values_available(self, product_tmpl_id, check_val_ids, value_ids):
+        """Evaluate the availability of check_val_ids against the compiled
+        restrictions of the template, see values_available"""
+        config_restrictions = self._get_config_restrictions(product_tmpl_id)
+        bits = config_restrictions["bits"]
+        restrictions = config_restrictions["restrictions"]
+        value_restrictions = config_restrictions["value_restrictions"]
+        mask = self._get_config_mask(config_restrictions, value_ids or [])
+
+        # Evaluate every candidate in one pass, each distinct restriction is
+        # evaluated once unless a restricted value is dropped from the
+        # configuration which changes the outcome of the following ones
+        results = {}
         avail_val_ids = []
         for attr_val_id in check_val_ids:
-            config_lines = product_tmpl.config_line_ids.filtered(
-                lambda l: attr_val_id in l.value_ids.ids
-            )
-            domains = config_lines.mapped("domain_id").compute_domain()
-            avail = self.validate_domains_against_sels(domains, value_ids, custom_vals)
+            restriction_idx = value_restrictions.get(attr_val_id)
+            if restriction_idx is None:
+                avail_val_ids.append(attr_val_id)
+                continue
+            avail = results.get(restriction_idx)
+            if avail is None:
+                avail = results[restriction_idx] = self._eval_config_restriction(
+                    restrictions[restriction_idx], mask
+                )
             if avail:
                 avail_val_ids.append(attr_val_id)
-            elif attr_val_id in value_ids:
-                value_ids.remove(attr_val_id)
+            elif attr_val_id in bits and mask & (1 << bits[attr_val_id]):
+                mask &= ~(1 << bits[attr_val_id])
+                results.clear()
+
+        return tuple(avail_val_ids)
+
+    @api.model
+    def _get_config_memo(self):
+        """Return the memo of the configuration computations of the current
+        transaction, it is dropped on commit and rollback"""
+        data = self.env.cr.precommit.data
+        memo = data.get("product_configurator.memo")
+        if memo is None:
+            memo = data["product_configurator.memo"] = {
+                "values": {},
+                "hits": 0,
+                "misses": 0,
+            }
+        return memo
 
-        return avail_val_ids
+    @api.model
+    def _config_memoize(self, key, func, *args):
+        """Return the result of func(*args) memoized under key for the
+        current transaction
+
+        :param key: hashable key built from the template and the frozen
+                    configuration the result depends on
+        :param func: callable computing the result on a miss, it should
+                     return immutable values
+        """
+        memo = self._get_config_memo()
+        if key in memo["values"]:
+            memo["hits"] += 1
+            return memo["values"][key]
+        memo["misses"] += 1
+        res = memo["values"][key] = func(*args)
+        return res
+
+    @api.model
+    def _clear_config_memo(self):
+        """Drop the memoized configuration computations, to be called when
+        the configuration or the data it is computed from changes"""
+        memo = self.env.cr.precommit.data.get("product_configurator.memo")
+        if memo is not None:
+            memo["values"].clear()
+
+    @api.model
+    def get_config_memo_stats(self):
+        """Return the hit and miss counters of the configuration memo of
+        the current transaction"""
+        memo = self._get_config_memo()
+        return {
+            "hits": memo["hits"],
+            "misses": memo["misses"],
+            "size": len(memo["values"]),
+        }
+
+    @api.model
+    def _get_config_memo_custom_key(self, custom_vals):
+        """Return a hashable representation of custom_vals"""
+        return tuple(
+            sorted((attr_id, repr(val)) for attr_id, val in (custom_vals or {}).items())
+        )
 
     @api.model
     def get_extra_attribute_line_ids(self, product_template_id):
@@ -1238,22 +2779,48 @@ class ProductConfigSession(models.Model):
         )
         return extra_attribute_line_ids
 
+    @api.model
+    def _get_attr_lines_availability(self, product_tmpl_id, value_ids):
+        """Evaluate once the availability of the values of every attribute
+        line of the template given the configuration value_ids, shared by
+        the open steps and the configuration validation
+
+        :param product_tmpl_id: id of the product.template
+        :param value_ids: list of attribute value ids
+        :returns: {attribute_line_id: tuple(available attribute value ids)}
+        """
+        memo_key = ("attr_lines_availability", product_tmpl_id, frozenset(value_ids))
+        return self._config_memoize(
+            memo_key, self._compute_attr_lines_availability, product_tmpl_id, value_ids
+        )
+
+    @api.model
+    def _compute_attr_lines_availability(self, product_tmpl_id, value_ids):
+        product_tmpl = self.env["product.template"].browse(product_tmpl_id)
+        return frozendict(
+            {
+                line.id: self._compute_values_available(
+                    product_tmpl_id, line.value_ids.ids, value_ids
+                )
+                for line in product_tmpl.attribute_line_ids
+            }
+        )
+
     def check_attributes_configuration(
         self, attribute_line_ids, custom_vals, value_ids, final=True
     ):
+        value_set = set(value_ids)
         for line in attribute_line_ids:
             # Validate custom values
             attr = line.attribute_id
             if attr.id in custom_vals:
                 attr.validate_custom_val(custom_vals[attr.id])
             if final:
-                common_vals = set(value_ids) & set(line.value_ids.ids)
+                common_vals = value_set & set(line.value_ids.ids)
                 custom_val = custom_vals.get(attr.id)
-                avail_val_ids = self.values_available(
-                    line.value_ids.ids,
-                    value_ids,
-                    product_tmpl_id=self.product_tmpl_id,
-                )
+                avail_val_ids = self._get_attr_lines_availability(
+                    line.product_tmpl_id.id, value_ids
+                )[line.id]
                 if (
                     line.required
                     and avail_val_ids
@@ -1364,12 +2931,12 @@ class ProductConfigSession(models.Model):
         mono_attr_lines = product_tmpl.attribute_line_ids.filtered(
             lambda l: not l.multi
         )
+        value_set = set(value_ids)
         attrs_with_error = {}
         for line in mono_attr_lines:
-            if len(set(line.value_ids.ids) & set(value_ids)) > 1:
-                wrong_vals = self.env["product.attribute.value"].browse(
-                    set(line.value_ids.ids) & set(value_ids)
-                )
+            line_value_ids = value_set.intersection(line.value_ids.ids)
+            if len(line_value_ids) > 1:
+                wrong_vals = self.env["product.attribute.value"].browse(line_value_ids)
                 attrs_with_error[line.attribute_id] = wrong_vals
         if attrs_with_error:
             error_message = _(
@@ -1419,14 +2986,6 @@ class ProductConfigSession(models.Model):
             product_tmpl_id=product_tmpl_id, value_ids=value_ids
         )
         products = self.env["product.product"].search(domain)
-
-        # At this point, we might have found products with all of the passed
-        # in values, but it might have more attributes!  These are NOT
-        # matches
-        more_attrs = products.filtered(
-            lambda p: len(p.product_template_attribute_value_ids) != len(value_ids)
-        )
-        products -= more_attrs
         return products
 
     def search_session(self, product_tmpl_id, parent_id=None):
@@ -0,0 +1,40 @@
+from odoo import api, models
+
+
+class ProductPricelistItem(models.Model):
+    _inherit = "product.pricelist.item"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ProductPricelistItem, self).create(vals_list)
+        res._clear_config_extra_prices_cache()
+        return res
+
+    def write(self, vals):
+        """Invalidate the cached extra prices of the attribute values"""
+        self._clear_config_extra_prices_cache()
+        res = super(ProductPricelistItem, self).write(vals)
+        self._clear_config_extra_prices_cache()
+        return res
+
+    def unlink(self):
+        self._clear_config_extra_prices_cache()
+        return super(ProductPricelistItem, self).unlink()
+
+    def _clear_config_extra_prices_cache(self):
+        """Invalidate the cached extra prices only if the items apply to
+        products related to attribute values"""
+        if any(item.applied_on in ("3_global", "2_product_category") for item in self):
+            domain = [("product_id", "!=", False)]
+        else:
+            domain = [
+                "|",
+                ("product_id", "in", self.mapped("product_id").ids),
+                (
+                    "product_id.product_tmpl_id",
+                    "in",
+                    self.mapped("product_tmpl_id").ids,
+                ),
+            ]
+        self.env["product.attribute.value"]._clear_extra_prices_cache(domain)
+        self.env["product.config.session"]._clear_config_memo()
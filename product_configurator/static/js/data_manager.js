@@ -9,15 +9,35 @@ odoo.define("product_configurator.DataManager", function (require) {
          * heavy reliance on the fields_view_get method to generate and update
          * dynamic content.
          *
+         * Only the cached views of the requested model are dropped, the
+         * actions, filters and views of the other models are kept.
+         *
          * @param {Object} params see load_view documentation
          * @param {Object} options see load_view documentation
          * @returns the load_views expected result
          */
         load_views: function (params, options) {
             if (params.context.view_cache === false) {
-                this.invalidate();
+                this._invalidateModelViews(params.model);
             }
             return this._super(params, options);
         },
+
+        /**
+         * Remove the cached views of a model, the keys of the views cache
+         * start with the model name (see _gen_key).
+         *
+         * @private
+         * @param {String} model
+         */
+        _invalidateModelViews: function (model) {
+            var prefix = model + ",";
+            var views = this._cache.views;
+            _.each(_.keys(views), function (key) {
+                if (key.indexOf(prefix) === 0) {
+                    delete views[key];
+                }
+            });
+        },
     });
 });
@@ -686,3 +686,76 @@ class TestProduct(ProductConfiguratorTestCases):
                     "config_line_ids": product_config_line,
                 }
             )
+
+    def test_26_compute_product_price_extra(self):
+        product_product = self._get_product_id()
+        productAttPrice = self.env["product.template.attribute.value"].search(
+            [
+                ("product_tmpl_id", "=", self.config_product.id),
+                ("product_attribute_value_id", "=", self.value_gasoline.id),
+            ]
+        )
+        productAttPrice.price_extra = 45
+        product_product._compute_product_price_extra()
+        ptavs = product_product.product_template_attribute_value_ids
+        extra_prices = self.env[
+            "product.attribute.value"
+        ].get_attribute_value_extra_prices(
+            product_tmpl_id=self.config_product.id,
+            pt_attr_value_ids=ptavs.product_attribute_value_id,
+        )
+        self.assertEqual(
+            product_product.price_extra,
+            sum(extra_prices.values()),
+            "Error: If price_extra not equal\
+            Method: _compute_product_price_extra()",
+        )
+
+    def test_27_compute_product_weight_extra(self):
+        product_product = self._get_product_id()[:1]
+        ptavs = product_product.product_template_attribute_value_ids
+        for weight_extra, ptav in enumerate(ptavs, start=1):
+            ptav.weight_extra = weight_extra * 1.5
+        self.assertEqual(
+            product_product.weight_extra,
+            sum(ptavs.mapped("weight_extra")),
+            "Error: If SQL sum differs from the extra weights of the values\
+            Method: _compute_product_weight_extra()",
+        )
+        new_product = self.env["product.product"].new(
+            {
+                "product_tmpl_id": self.config_product.id,
+                "product_template_attribute_value_ids": [(6, 0, ptavs.ids)],
+            }
+        )
+        self.assertEqual(
+            new_product.weight_extra,
+            product_product.weight_extra,
+            "Error: If in memory sum differs from the SQL sum\
+            Method: _compute_product_weight_extra()",
+        )
+
+    def test_28_get_cfg_weight_cache(self):
+        product_product = self._get_product_id()[:1]
+        ptavs = product_product.product_template_attribute_value_ids
+        session = self.env["product.config.session"].create(
+            {
+                "product_tmpl_id": self.config_product.id,
+                "value_ids": [(6, 0, ptavs.product_attribute_value_id.ids)],
+            }
+        )
+        weight = session.get_cfg_weight()
+        ptavs[:1].weight_extra += 3
+        self.assertAlmostEqual(
+            session.get_cfg_weight(),
+            weight + 3,
+            msg="Error: If cached extra weights not cleared\
+            Method: get_cfg_weight()",
+        )
+        self.config_product.weight += 10
+        self.assertAlmostEqual(
+            session.get_cfg_weight(),
+            weight + 13,
+            msg="Error: If weight not updated with the template weight\
+            Method: get_cfg_weight()",
+        )
@@ -180,3 +180,113 @@ class ProductAttributes(TransactionCase):
             "Error: If default_val not exists\
             Method: onchange_values()",
         )
+
+    def test_13_get_attribute_value_extra_prices(self):
+        ptav = self.ProductAttributePrice.search(
+            [
+                ("product_tmpl_id", "=", self.ProductTemplate.id),
+                ("product_attribute_value_id", "=", self.value_218i.id),
+            ]
+        )
+        attr_value_obj = self.env["product.attribute.value"]
+        ptav.price_extra = 100.0
+        extra_prices = attr_value_obj.get_attribute_value_extra_prices(
+            product_tmpl_id=self.ProductTemplate.id, pt_attr_value_ids=self.value_218i
+        )
+        self.assertEqual(
+            extra_prices,
+            {self.value_218i.id: 100.0},
+            "Error: If extra price not computed\
+            Method: get_attribute_value_extra_prices()",
+        )
+        # The cached extra prices follow the template attribute value
+        ptav.price_extra = 150.0
+        extra_prices = attr_value_obj.get_attribute_value_extra_prices(
+            product_tmpl_id=self.ProductTemplate.id, pt_attr_value_ids=self.value_218i
+        )
+        self.assertEqual(
+            extra_prices,
+            {self.value_218i.id: 150.0},
+            "Error: If cached extra price not invalidated\
+            Method: get_attribute_value_extra_prices()",
+        )
+
+    def test_14_get_attribute_value_extra_prices_quantity(self):
+        value_silver = self.env.ref(
+            "product_configurator.product_attribute_value_silver"
+        )
+        pricelist = self.env.user.partner_id.property_product_pricelist
+        attr_value_obj = self.env["product.attribute.value"]
+        unit_price = attr_value_obj.get_attribute_value_extra_prices(
+            product_tmpl_id=self.ProductTemplate.id,
+            pt_attr_value_ids=value_silver,
+            pricelist=pricelist,
+        )[value_silver.id]
+        self.env["product.pricelist.item"].create(
+            {
+                "pricelist_id": pricelist.id,
+                "applied_on": "0_product_variant",
+                "product_id": value_silver.product_id.id,
+                "min_quantity": 10,
+                "compute_price": "fixed",
+                "fixed_price": unit_price + 10,
+            }
+        )
+        self.assertEqual(
+            attr_value_obj.get_attribute_value_extra_prices(
+                product_tmpl_id=self.ProductTemplate.id,
+                pt_attr_value_ids=value_silver,
+                pricelist=pricelist,
+            ),
+            {value_silver.id: unit_price},
+            "Error: If quantity rule applied to a single unit\
+            Method: get_attribute_value_extra_prices()",
+        )
+        self.assertEqual(
+            attr_value_obj.with_context(quantity=10).get_attribute_value_extra_prices(
+                product_tmpl_id=self.ProductTemplate.id,
+                pt_attr_value_ids=value_silver,
+                pricelist=pricelist,
+            ),
+            {value_silver.id: unit_price + 10},
+            "Error: If quantity rule ignored by the cached extra prices\
+            Method: get_attribute_value_extra_prices()",
+        )
+
+    def test_15_price_extra_standard_template(self):
+        product_tmpl = self.env["product.template"].create(
+            {
+                "name": "Standard Car",
+                "attribute_line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "attribute_id": self.attr_fuel.id,
+                            "value_ids": [(6, 0, [self.value_gasoline.id])],
+                        },
+                    )
+                ],
+            }
+        )
+        ptav = product_tmpl.attribute_line_ids.product_template_value_ids
+        ptav.price_extra = 100.0
+        self.assertFalse(
+            product_tmpl.config_price_version,
+            "Error: If configuration prices recomputed for standard template\
+            Method: write()",
+        )
+        config_ptav = self.ProductAttributePrice.search(
+            [
+                ("product_tmpl_id", "=", self.ProductTemplate.id),
+                ("product_attribute_value_id", "=", self.value_218i.id),
+            ]
+        )
+        price_version = self.ProductTemplate.config_price_version
+        config_ptav.price_extra = 100.0
+        self.assertEqual(
+            self.ProductTemplate.config_price_version,
+            price_version + 1,
+            "Error: If configuration prices not recomputed\
+            Method: write()",
+        )
@@ -1,4 +1,11 @@
-from odoo.exceptions import UserError, ValidationError
+from contextlib import closing
+
+from PIL import Image
+from psycopg2 import OperationalError, errorcodes
+
+from odoo import SUPERUSER_ID, api, fields, sql_db
+from odoo.exceptions import AccessError, UserError, ValidationError
+from odoo.tools import image as image_tools, mute_logger
 
 from ..tests.test_product_configurator_test_cases import ProductConfiguratorTestCases
 
@@ -709,3 +716,788 @@ class ProductConfig(ProductConfiguratorTestCases):
             "Error: If value exists\
             Method: values_available()",
         )
+
+    def test_21_values_available_compiled_restrictions(self):
+        product_tmpl = self.config_product
+        check_val_ids = product_tmpl.attribute_line_ids.mapped("value_ids").ids
+        value_ids = [self.value_diesel.id]
+        expected_ids = []
+        for attr_val_id in check_val_ids:
+            config_lines = product_tmpl.config_line_ids.filtered(
+                lambda line: attr_val_id in line.value_ids.ids
+            )
+            domains = config_lines.mapped("domain_id").compute_domain()
+            if self.productConfigSession.validate_domains_against_sels(
+                domains, value_ids, {}
+            ):
+                expected_ids.append(attr_val_id)
+        available_value_ids = self.productConfigSession.values_available(
+            check_val_ids, value_ids, {}, product_tmpl.id
+        )
+        self.assertEqual(
+            available_value_ids,
+            expected_ids,
+            "Error: If compiled restrictions differ from config lines\
+            Method: values_available()",
+        )
+        # Removing the restriction must invalidate the compiled rules
+        self.assertNotIn(self.value_218i.id, available_value_ids)
+        product_tmpl.config_line_ids.filtered(
+            lambda line: self.value_218i in line.value_ids
+        ).unlink()
+        available_value_ids = self.productConfigSession.values_available(
+            check_val_ids, value_ids, {}, product_tmpl.id
+        )
+        self.assertIn(self.value_218i.id, available_value_ids)
+
+    def test_22_get_config_restrictions(self):
+        config_restrictions = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )
+        value_restrictions = config_restrictions["value_restrictions"]
+        # Values restricted by the same rules share the compiled restriction
+        self.assertEqual(
+            value_restrictions[self.value_218i.id],
+            value_restrictions[self.value_220i.id],
+        )
+        restriction = config_restrictions["restrictions"][
+            value_restrictions[self.value_218i.id]
+        ]
+        gasoline_mask = self.productConfigSession._get_config_mask(
+            config_restrictions, [self.value_gasoline.id]
+        )
+        diesel_mask = self.productConfigSession._get_config_mask(
+            config_restrictions, [self.value_diesel.id]
+        )
+        self.assertTrue(
+            self.productConfigSession._eval_config_restriction(
+                restriction, gasoline_mask
+            )
+        )
+        self.assertFalse(
+            self.productConfigSession._eval_config_restriction(restriction, diesel_mask)
+        )
+
+    def test_23_trans_implied_recursion(self):
+        self.domain_gasolin.write({"implied_ids": [(6, 0, [self.domain_engine.id])]})
+        self.assertEqual(
+            self.domain_gasolin.trans_implied_ids,
+            self.domain_gasolin | self.domain_engine,
+            "Error: If transitive closure not updated\
+            Method: _get_trans_implied()",
+        )
+        computed_domain = self.domain_gasolin.compute_domain()
+        for operand in self.domain_engine.compute_domain():
+            self.assertIn(
+                operand,
+                computed_domain,
+                "Error: If implied restrictions not included\
+                Method: compute_domain()",
+            )
+        with self.assertRaises(ValidationError):
+            self.domain_engine.write(
+                {"implied_ids": [(6, 0, [self.domain_gasolin.id])]}
+            )
+
+    def test_24_get_config_restrictions_index(self):
+        config_restrictions = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )
+        config_lines = self.config_product.config_line_ids
+        for value in self.config_product.attribute_line_ids.mapped("value_ids"):
+            self.assertEqual(
+                config_restrictions["value_config_lines"].get(value.id, ()),
+                tuple(config_lines.filtered(lambda line: value in line.value_ids).ids),
+                "Error: If config lines of value not indexed\
+                Method: _get_config_restrictions()",
+            )
+        for config_line in config_lines:
+            self.assertEqual(
+                config_restrictions["domains"][config_line.domain_id.id]["value_ids"],
+                frozenset(
+                    config_line.domain_id.domain_line_ids.mapped("value_ids").ids
+                ),
+                "Error: If restriction values not indexed\
+                Method: _get_config_restrictions()",
+            )
+
+    def test_25_config_memo(self):
+        check_val_ids = [self.value_218i.id, self.value_220i.id]
+        value_ids = [self.value_gasoline.id]
+        avail_val_ids = self.session_id.values_available(check_val_ids, value_ids)
+        stats = self.productConfigSession.get_config_memo_stats()
+        self.assertEqual(
+            self.session_id.values_available(check_val_ids, list(reversed(value_ids))),
+            avail_val_ids,
+            "Error: If memoized availability differs\
+            Method: values_available()",
+        )
+        self.assertEqual(
+            self.productConfigSession.get_config_memo_stats()["hits"],
+            stats["hits"] + 1,
+            "Error: If availability is not memoized\
+            Method: values_available()",
+        )
+        self.session_id.write({"value_ids": [(6, 0, value_ids)]})
+        self.session_id.get_cfg_price()
+        misses = self.productConfigSession.get_config_memo_stats()["misses"]
+        self.session_id.get_cfg_price()
+        self.assertEqual(
+            self.productConfigSession.get_config_memo_stats()["misses"],
+            misses,
+            "Error: If price is not memoized\
+            Method: get_cfg_price()",
+        )
+
+    def test_26_validate_configuration_single_pass(self):
+        self.session_id.validate_configuration(final=False)
+        stats = self.productConfigSession.get_config_memo_stats()
+        self.session_id.validate_configuration(final=False)
+        self.assertEqual(
+            self.productConfigSession.get_config_memo_stats()["misses"],
+            stats["misses"],
+            "Error: If availability is evaluated again\
+            Method: validate_configuration()",
+        )
+        with self.assertRaises(ValidationError):
+            self.session_id.validate_configuration(
+                value_ids=[self.value_diesel.id, self.value_gasoline.id],
+                final=False,
+            )
+
+    def test_27_config_fingerprint(self):
+        value_ids = self.session_id.value_ids.ids
+        fingerprint = self.productConfigSession.get_config_fingerprint(
+            self.config_product.id, value_ids
+        )
+        self.assertEqual(
+            self.session_id.config_fingerprint,
+            fingerprint,
+            "Error: If session fingerprint not computed\
+            Method: _compute_config_fingerprint()",
+        )
+        self.assertEqual(
+            self.productConfigSession.get_config_fingerprint(
+                self.config_product.id,
+                list(reversed(value_ids))
+                + self.productConfigSession.get_custom_value_id().ids,
+            ),
+            fingerprint,
+            "Error: If fingerprint depends on order or custom value\
+            Method: get_config_fingerprint()",
+        )
+
+    def test_28_create_get_variant_concurrent(self):
+        value_ids = [
+            self.value_gasoline.id,
+            self.value_220i.id,
+            self.value_red.id,
+            self.value_rims_378.id,
+            self.value_model_sport_line.id,
+            self.value_tapistry.id,
+            self.value_transmission.id,
+            self.value_options_2.id,
+        ]
+        session = self.productConfigSession.create(
+            {
+                "product_tmpl_id": self.config_product.id,
+                "value_ids": [(6, 0, value_ids)],
+            }
+        )
+        # The same variant is committed by another transaction after the
+        # snapshot of the test transaction was taken
+        with closing(sql_db.db_connect(self.env.cr.dbname).cursor()) as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            other_session = env["product.config.session"].new(
+                {
+                    "product_tmpl_id": self.config_product.id,
+                    "value_ids": [(6, 0, value_ids)],
+                }
+            )
+            variant_id = (
+                env["product.product"]
+                .create(other_session.get_variant_vals(value_ids, {}))
+                .id
+            )
+            cr.commit()
+
+        def unlink_variant():
+            # Not through unlink(), which removes the template of the last
+            # variant
+            with closing(sql_db.db_connect(self.env.cr.dbname).cursor()) as cr:
+                cr.execute("DELETE FROM product_product WHERE id = %s", (variant_id,))
+                cr.commit()
+
+        self.addCleanup(unlink_variant)
+        with self.assertRaises(OperationalError) as error, mute_logger("odoo.sql_db"):
+            session.create_get_variant()
+        self.assertEqual(
+            error.exception.pgcode,
+            errorcodes.SERIALIZATION_FAILURE,
+            "Error: If invisible concurrent variant not retried\
+            Method: create_get_variant()",
+        )
+
+    def test_29_create_get_variants(self):
+        variant = self.config_product.product_variant_ids[:1]
+        variant_value_ids = (
+            variant.product_template_attribute_value_ids.product_attribute_value_id.ids
+        )
+        res = self.productConfigSession.create_get_variants(
+            self.config_product.id,
+            [
+                variant_value_ids,
+                [self.value_diesel.id, self.value_gasoline.id],
+                list(reversed(variant_value_ids)),
+            ],
+        )
+        self.assertEqual(
+            res["variants"],
+            {0: variant.id, 2: variant.id},
+            "Error: If existing variant not retrieved\
+            Method: create_get_variants()",
+        )
+        self.assertEqual(
+            list(res["errors"]),
+            [1],
+            "Error: If invalid configuration not reported\
+            Method: create_get_variants()",
+        )
+
+    def test_30_recompute_template_prices(self):
+        done_session = self.session_id.copy()
+        self.env.cr.execute(
+            "UPDATE product_config_session SET state = 'done' WHERE id = %s",
+            (done_session.id,),
+        )
+        done_session.invalidate_cache(["state"])
+        old_price = done_session.price
+        self.productConfigSession.flush()
+        self.env.cr.execute(
+            "SELECT ctid FROM product_config_session WHERE id = %s",
+            (done_session.id,),
+        )
+        done_session_ctid = self.env.cr.fetchone()[0]
+        self.config_product.list_price += 100
+        self.productConfigSession.flush()
+        self.assertEqual(
+            self.session_id.price,
+            self.session_id.get_cfg_price(),
+            "Error: If draft session price not recomputed\
+            Method: _recompute_template_prices()",
+        )
+        self.env.cr.execute(
+            "SELECT ctid FROM product_config_session WHERE id = %s",
+            (done_session.id,),
+        )
+        self.assertEqual(
+            self.env.cr.fetchone()[0],
+            done_session_ctid,
+            "Error: If template edit writes on old sessions\
+            Method: _recompute_template_prices()",
+        )
+        self.assertEqual(
+            done_session.price,
+            old_price,
+            "Error: If old session recomputed in the editing transaction\
+            Method: _recompute_template_prices()",
+        )
+        self.assertLess(
+            done_session.price_version,
+            self.config_product.config_price_version,
+            "Error: If template price version not incremented\
+            Method: _recompute_template_prices()",
+        )
+        self.productConfigSession._cron_recompute_outdated_prices()
+        self.assertEqual(
+            done_session.price_version,
+            self.config_product.config_price_version,
+            "Error: If outdated session not recomputed\
+            Method: _cron_recompute_outdated_prices()",
+        )
+        self.assertEqual(
+            done_session.price,
+            self.session_id.price,
+            "Error: If outdated session price not recomputed\
+            Method: _cron_recompute_outdated_prices()",
+        )
+
+    def test_31_get_config_image(self):
+        value_ids = self.session_id.value_ids.ids
+        expected_image = self.config_product
+        max_matches = 0
+        for config_image in self.config_product.config_image_ids:
+            matches = len(set(config_image.value_ids.ids) & set(value_ids))
+            if matches > max_matches:
+                expected_image = config_image
+                max_matches = matches
+        self.assertEqual(
+            self.session_id._get_config_image(value_ids),
+            expected_image,
+            "Error: If best matching image differs\
+            Method: _get_config_image()",
+        )
+        # The index follows the changes of the images
+        self.config_image_red.write({"value_ids": [(6, 0, value_ids)]})
+        self.assertEqual(
+            self.session_id._get_config_image(value_ids),
+            self.config_image_red,
+            "Error: If image index not invalidated\
+            Method: _get_config_image()",
+        )
+
+    def test_32_get_config_image_url(self):
+        self.assertEqual(
+            self.productConfigSession._get_config_image_field(200),
+            "image_256",
+            "Error: If image field not matching the size\
+            Method: _get_config_image_field()",
+        )
+        self.assertEqual(
+            self.productConfigSession._get_config_image_field(),
+            "image_1920",
+            "Error: If default image field is not image_1920\
+            Method: _get_config_image_field()",
+        )
+        value_ids = self.session_id.value_ids.ids
+        self.config_image_red.write({"value_ids": [(6, 0, value_ids)]})
+        image_url = self.session_id.get_config_image_url(value_ids, size=128)
+        self.assertTrue(
+            image_url.startswith(
+                "/web/image/product.config.image/%s/image_128?unique="
+                % self.config_image_red.id
+            ),
+            "Error: If url not pointing to the sized image\
+            Method: get_config_image_url()",
+        )
+
+    def test_33_variant_config_image(self):
+        value_ids = self.session_id.value_ids.ids
+        self.config_image_red.write({"value_ids": [(6, 0, value_ids)]})
+        vals = self.session_id.get_variant_vals()
+        self.assertEqual(
+            vals.get("config_image_id"),
+            self.config_image_red.id,
+            "Error: If variant not linked to the configuration image\
+            Method: get_variant_vals()",
+        )
+        self.assertNotIn(
+            "image_1920",
+            vals,
+            "Error: If configuration image copied on the variant\
+            Method: get_variant_vals()",
+        )
+        variant = self.config_product.product_variant_ids.filtered(
+            lambda product: not product.image_variant_1920
+        )[:1]
+        variant.config_image_id = self.config_image_red
+        self.assertEqual(
+            variant.image_128,
+            self.config_image_red.image_128,
+            "Error: If variant not showing the configuration image\
+            Method: _compute_image_128()",
+        )
+        variant.image_variant_1920 = image_tools.image_to_base64(
+            Image.new("RGB", (4, 4), "green"), "PNG"
+        )
+        self.assertEqual(
+            variant.image_128,
+            variant.image_variant_128,
+            "Error: If variant image not preferred over configuration image\
+            Method: _compute_image_128()",
+        )
+
+    def test_34_layered_config_image(self):
+        self.config_product.config_image_mode = "layers"
+        for value, color in ((self.value_gasoline, "red"), (self.value_red, "blue")):
+            value.image = image_tools.image_to_base64(
+                Image.new("RGBA", (4, 4), color), "PNG"
+            )
+        value_ids = self.session_id.value_ids.ids
+        rendered_image = self.session_id._get_config_image(value_ids)
+        self.assertEqual(
+            rendered_image._name,
+            "product.config.image.cache",
+            "Error: If layered image not rendered\
+            Method: _get_config_image()",
+        )
+        self.assertTrue(
+            rendered_image.image_128,
+            "Error: If rendered image is empty\
+            Method: _render_layers()",
+        )
+        self.session_id._clear_config_memo()
+        self.assertEqual(
+            self.session_id._get_config_image(value_ids),
+            rendered_image,
+            "Error: If rendered image not reused from the cache\
+            Method: _get_layered_image()",
+        )
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        ICPSudo.set_param("product_configurator.config_image_cache_size", 0)
+        self.env["product.config.image.cache"]._cron_evict_cache()
+        self.assertTrue(
+            rendered_image.exists(),
+            "Error: If recently used image evicted\
+            Method: _cron_evict_cache()",
+        )
+        ICPSudo.set_param("product_configurator.config_image_cache_grace_hours", 0)
+        rendered_image.last_used = fields.Datetime.subtract(
+            fields.Datetime.now(), hours=1
+        )
+        self.env["product.config.image.cache"]._cron_evict_cache()
+        self.assertFalse(
+            rendered_image.exists(),
+            "Error: If rendered image not evicted\
+            Method: _cron_evict_cache()",
+        )
+
+    def test_35_get_components_prices(self):
+        tax = self.env["account.tax"].create(
+            {"name": "Component Tax 10%", "amount": 10.0, "amount_type": "percent"}
+        )
+        for value, list_price in ((self.value_gasoline, 10.0), (self.value_red, 20.0)):
+            value.product_id = self.env["product.product"].create(
+                {
+                    "name": "Component %s" % value.name,
+                    "list_price": list_price,
+                    "taxes_id": [(6, 0, tax.ids)],
+                }
+            )
+        pricelist = self.env["product.pricelist"].create(
+            {"name": "Components", "currency_id": self.env.company.currency_id.id}
+        )
+        prices = self.session_id.get_components_prices(
+            {"vals": [], "taxes": 0.0, "total": 0.0},
+            pricelist,
+            value_ids=[self.value_gasoline.id, self.value_red.id],
+        )
+        self.assertEqual(
+            sorted(price for _attr, _name, price in prices["vals"]),
+            [10.0, 20.0],
+            "Error: If component prices are wrong\
+            Method: get_components_prices()",
+        )
+        self.assertAlmostEqual(
+            prices["taxes"],
+            3.0,
+            msg="Error: If component taxes are wrong\
+            Method: get_components_prices()",
+        )
+        self.assertAlmostEqual(
+            prices["total"],
+            33.0,
+            msg="Error: If component total is wrong\
+            Method: get_components_prices()",
+        )
+
+    def test_36_price_rules(self):
+        attribute = self.value_red.attribute_id
+        attr_line = self.config_product.attribute_line_ids.filtered(
+            lambda line: line.attribute_id == attribute
+        )
+        value_ids = self.session_id.value_ids.ids
+        price = self.session_id.get_cfg_price(value_ids, custom_vals={})
+        self.env["product.config.price.rule"].create(
+            {
+                "name": "Price per unit",
+                "product_tmpl_id": self.config_product.id,
+                "attribute_line_id": attr_line.id,
+                "expression": "(custom_value or 0) * 0.5 + 10",
+            }
+        )
+        self.assertEqual(
+            self.session_id.get_cfg_price(value_ids, custom_vals={attribute.id: 100.0}),
+            price + 60.0,
+            "Error: If price rule not applied\
+            Method: get_cfg_price()",
+        )
+        with self.assertRaises(ValidationError):
+            self.env["product.config.price.rule"].create(
+                {
+                    "name": "Forbidden",
+                    "product_tmpl_id": self.config_product.id,
+                    "attribute_line_id": attr_line.id,
+                    "expression": "__import__('os')",
+                }
+            )
+
+    def test_37_get_config_restrictions_steps(self):
+        config_restrictions = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )
+        step_lines = self.config_product.config_step_line_ids
+        for attr_line in self.config_product.attribute_line_ids:
+            self.assertEqual(
+                config_restrictions["attr_line_steps"].get(attr_line.id, ()),
+                tuple(
+                    step_lines.filtered(
+                        lambda step_line: attr_line in step_line.attribute_line_ids
+                    ).ids
+                ),
+                "Error: If steps of attribute line not precomputed\
+                Method: _get_config_restrictions()",
+            )
+        step_line = step_lines[:1]
+        attr_line = step_line.attribute_line_ids[:1]
+        step_line.write({"attribute_line_ids": [(3, attr_line.id)]})
+        config_restrictions = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )
+        self.assertNotIn(
+            step_line.id,
+            config_restrictions["attr_line_steps"].get(attr_line.id, ()),
+            "Error: If steps not invalidated on step line change\
+            Method: _get_config_restrictions()",
+        )
+
+    def test_38_apply_config_delta(self):
+        attribute = self.value_red.attribute_id
+        attr_line = self.config_product.attribute_line_ids.filtered(
+            lambda line: line.attribute_id == attribute
+        )
+        other_value = attr_line.value_ids - self.value_red
+        other_value = other_value[:1]
+        res = self.session_id.apply_config_delta({str(attribute.id): other_value.id})
+        self.assertIn(
+            other_value.id,
+            res["value_ids"],
+            "Error: If delta value not applied\
+            Method: apply_config_delta()",
+        )
+        self.assertNotIn(
+            self.value_red.id,
+            self.session_id.value_ids.ids,
+            "Error: If replaced value still in session\
+            Method: apply_config_delta()",
+        )
+        self.assertEqual(
+            res["price"],
+            self.session_id.get_cfg_price(res["value_ids"]),
+            "Error: If price of the delta differs\
+            Method: apply_config_delta()",
+        )
+        with self.assertRaises(UserError):
+            self.session_id.apply_config_delta({attribute.id: self.value_gasoline.id})
+        config_user = self.env["res.users"].create(
+            {
+                "name": "Configurator User",
+                "login": "configurator_user",
+                "groups_id": [
+                    (
+                        6,
+                        0,
+                        [
+                            self.env.ref("base.group_user").id,
+                            self.env.ref(
+                                "product_configurator.group_product_configurator"
+                            ).id,
+                        ],
+                    )
+                ],
+            }
+        )
+        with self.assertRaises(AccessError):
+            self.session_id.with_user(config_user).apply_config_delta(
+                {attribute.id: self.value_red.id}
+            )
+        self.session_id.state = "done"
+        with self.assertRaises(UserError):
+            self.session_id.apply_config_delta({attribute.id: self.value_red.id})
+
+    def test_39_configure_many(self):
+        variant = self.config_product.product_variant_ids[:1]
+        variant_value_ids = (
+            variant.product_template_attribute_value_ids.product_attribute_value_id.ids
+        )
+        results = self.productConfigSession.configure_many(
+            [
+                {
+                    "product_tmpl_id": self.config_product.id,
+                    "value_ids": variant_value_ids,
+                },
+                {
+                    "product_tmpl_id": self.config_product.id,
+                    "value_ids": variant_value_ids,
+                    "target": {"model": "res.partner", "res_id": 1},
+                },
+            ],
+            chunk_size=1,
+        )
+        self.assertEqual(
+            results[0]["product_id"],
+            variant.id,
+            "Error: If existing variant not returned\
+            Method: configure_many()",
+        )
+        self.assertEqual(
+            self.productConfigSession.browse(results[0]["session_id"]).state,
+            "done",
+            "Error: If configuration session not confirmed\
+            Method: configure_many()",
+        )
+        self.assertTrue(
+            results[1]["error"] and not results[1]["session_id"],
+            "Error: If failing item not rolled back and reported\
+            Method: configure_many()",
+        )
+
+    def test_40_write_value_ids_diff(self):
+        value_ids = self.session_id.value_ids.ids
+        self.assertFalse(
+            self.session_id._get_value_ids_diff_commands(value_ids),
+            "Error: If commands returned for unchanged values\
+            Method: _get_value_ids_diff_commands()",
+        )
+        self.assertEqual(
+            self.session_id._minimize_config_vals(
+                {"value_ids": [(6, 0, value_ids)], "config_step": "select"}
+            ),
+            {"config_step": "select"},
+            "Error: If unchanged values are written\
+            Method: _minimize_config_vals()",
+        )
+        new_value_ids = [
+            val_id for val_id in value_ids if val_id != self.value_red.id
+        ] + [self.value_silver.id]
+        self.assertEqual(
+            self.session_id._get_value_ids_diff_commands(new_value_ids),
+            [(3, self.value_red.id), (4, self.value_silver.id)],
+            "Error: If commands are not limited to the changed values\
+            Method: _get_value_ids_diff_commands()",
+        )
+        self.session_id.write({"value_ids": [(6, 0, new_value_ids)]})
+        self.assertEqual(
+            set(self.session_id.value_ids.ids),
+            set(new_value_ids),
+            "Error: If values not replaced\
+            Method: write()",
+        )
+
+    def test_41_config_restrictions_version(self):
+        version = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )["version"]
+        attr_line_color = self.config_product.attribute_line_ids.filtered(
+            lambda line: self.value_red in line.value_ids
+        )
+        # Reuse the restriction of the gasoline engines for another value
+        self.env["product.config.line"].create(
+            {
+                "product_tmpl_id": self.config_product.id,
+                "attribute_line_id": attr_line_color.id,
+                "value_ids": [(6, 0, self.value_red.ids)],
+                "domain_id": self.config_product_1.domain_id.id,
+            }
+        )
+        self.assertNotEqual(
+            self.productConfigSession._get_config_restrictions(self.config_product.id)[
+                "version"
+            ],
+            version,
+            "Error: If restrictions version unchanged by a new config line\
+            Method: _get_config_restrictions()",
+        )
+        version = self.productConfigSession._get_config_restrictions(
+            self.config_product.id
+        )["version"]
+        # A value added to a line without restriction
+        attr_line_color.value_ids |= self.productAttributeVals.create(
+            {"name": "Purple", "attribute_id": attr_line_color.attribute_id.id}
+        )
+        self.assertNotEqual(
+            self.productConfigSession._get_config_restrictions(self.config_product.id)[
+                "version"
+            ],
+            version,
+            "Error: If restrictions version unchanged by a new line value\
+            Method: _get_config_restrictions()",
+        )
+
+    def test_42_config_memo_price_invalidation(self):
+        value_ids = [
+            self.value_gasoline.id,
+            self.value_transmission.id,
+            self.value_silver.id,
+        ]
+        pricelist = self.env.user.partner_id.property_product_pricelist
+        silver_product = self.value_silver.product_id
+        silver_price = silver_product.with_context(pricelist=pricelist.id).price
+        price = self.session_id.get_cfg_price(value_ids)
+        self.env["product.pricelist.item"].create(
+            {
+                "pricelist_id": pricelist.id,
+                "applied_on": "0_product_variant",
+                "product_id": silver_product.id,
+                "compute_price": "fixed",
+                "fixed_price": silver_price + 50,
+            }
+        )
+        self.assertAlmostEqual(
+            self.session_id.get_cfg_price(value_ids),
+            price + 50,
+            msg="Error: If memoized price not cleared by a pricelist change\
+            Method: get_cfg_price()",
+        )
+
+    def test_43_recompute_prices_failing_rule(self):
+        done_session = self.session_id.copy()
+        self.env.cr.execute(
+            "UPDATE product_config_session SET state = 'done' WHERE id = %s",
+            (done_session.id,),
+        )
+        done_session.invalidate_cache(["state"])
+        price = self.session_id.price
+        attr_line = self.config_product.attribute_line_ids.filtered(
+            lambda line: line.attribute_id == self.value_red.attribute_id
+        )
+        with mute_logger("odoo.addons.product_configurator.models.product_config"):
+            self.env["product.config.price.rule"].create(
+                {
+                    "name": "Failing rule",
+                    "product_tmpl_id": self.config_product.id,
+                    "attribute_line_id": attr_line.id,
+                    "expression": "1 / 0",
+                }
+            )
+            self.productConfigSession._cron_recompute_outdated_prices()
+        self.assertEqual(
+            self.session_id.price,
+            price,
+            "Error: If session price changed by a failing price rule\
+            Method: _recompute_prices()",
+        )
+        for session in self.session_id | done_session:
+            self.assertEqual(
+                session.price_version,
+                self.config_product.config_price_version,
+                "Error: If failing session picked again by the cron\
+                Method: _recompute_prices()",
+            )
+
+    def test_44_config_memo_price_context(self):
+        value_ids = [
+            self.value_gasoline.id,
+            self.value_transmission.id,
+            self.value_silver.id,
+        ]
+        pricelist = self.env.user.partner_id.property_product_pricelist
+        silver_product = self.value_silver.product_id
+        silver_price = silver_product.with_context(pricelist=pricelist.id).price
+        self.env["product.pricelist.item"].create(
+            {
+                "pricelist_id": pricelist.id,
+                "applied_on": "0_product_variant",
+                "product_id": silver_product.id,
+                "min_quantity": 10,
+                "compute_price": "fixed",
+                "fixed_price": silver_price + 50,
+            }
+        )
+        price = self.session_id.get_cfg_price(value_ids)
+        self.assertAlmostEqual(
+            self.session_id.with_context(quantity=10).get_cfg_price(value_ids),
+            price + 50,
+            msg="Error: If memoized price ignores the quantity of the context\
+            Method: get_cfg_price()",
+        )
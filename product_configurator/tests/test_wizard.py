@@ -602,3 +602,88 @@ class ConfigurationWizard(ProductConfiguratorTestCases):
             "Error: If value exists\
             Method: get_onchange_domains()",
         )
+
+    def test_17_get_onchange_domains_incremental(self):
+        self.wizard = self.env["product.configurator"]
+        session_id = self.productConfigSession.create(
+            {
+                "product_tmpl_id": self.config_product.id,
+                "user_id": self.env.user.id,
+            }
+        )
+        field_prefix = self.wizard._prefixes.get("field_prefix")
+        values = {
+            field_prefix + str(line.attribute_id.id): False
+            for line in self.config_product.attribute_line_ids
+        }
+        gasoline_val_ids = [
+            self.value_gasoline.id,
+            self.value_218i.id,
+            self.value_sport_line.id,
+        ]
+        prev_domains = self.wizard.get_onchange_domains(
+            values, gasoline_val_ids, self.config_product, session_id
+        )
+        diesel_val_ids = [
+            self.value_diesel.id,
+            self.value_218i.id,
+            self.value_sport_line.id,
+        ]
+        domains = self.wizard.get_onchange_domains(
+            values, diesel_val_ids, self.config_product, session_id
+        )
+        incremental_domains = self.wizard.get_onchange_domains(
+            values,
+            diesel_val_ids,
+            self.config_product,
+            session_id,
+            changed_attr_ids=self.value_diesel.attribute_id.ids,
+            prev_domains=prev_domains,
+        )
+        self.assertEqual(
+            domains,
+            incremental_domains,
+            "Error: If incremental domains differ from full evaluation\
+            Method: get_onchange_domains()",
+        )
+
+    def test_18_fields_view_get_cache(self):
+        product_config_wizard = self._check_wizard_nxt_step()
+        wizard = product_config_wizard.with_context(wizard_id=product_config_wizard.id)
+        res = wizard.fields_view_get()
+        self.assertEqual(
+            res["arch"],
+            wizard.fields_view_get()["arch"],
+            "Error: If cached arch differs from generated arch\
+            Method: fields_view_get()",
+        )
+        field_name = "__attribute-{}".format(self.attr_fuel.id)
+        self.assertIn(
+            "domain",
+            res["fields"][field_name],
+            "Error: If dynamic field domain not computed for the wizard\
+            Method: fields_get()",
+        )
+        static_fields = wizard._get_dynamic_fields_static(
+            product_config_wizard.product_tmpl_id.id
+        )
+        self.assertNotIn(
+            "domain",
+            static_fields[field_name][0],
+            "Error: If wizard domain stored in cached descriptors\
+            Method: _get_dynamic_fields_static()",
+        )
+
+    def test_19_fields_view_get_cache_invalidation(self):
+        product_config_wizard = self._check_wizard_nxt_step()
+        wizard = product_config_wizard.with_context(wizard_id=product_config_wizard.id)
+        field_name = "__attribute-{}".format(self.attr_fuel.id)
+        wizard.fields_view_get()
+        self.attr_fuel.name = "Fuel Type"
+        res = wizard.fields_view_get()
+        self.assertEqual(
+            res["fields"][field_name]["string"],
+            "Fuel Type",
+            "Error: If cached descriptors not cleared on attribute change\
+            Method: _get_dynamic_fields_static()",
+        )
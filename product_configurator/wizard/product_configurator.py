@@ -1,3 +1,5 @@
+import json
+
 from lxml import etree
 
 from odoo import _, api, fields, models, tools
@@ -22,6 +24,9 @@ class ProductConfigurator(models.TransientModel):
     _name = "product.configurator"
     _inherits = {"product.config.session": "config_session_id"}
     _description = "Product configuration Wizard"
+    # Size of the configuration image shown in the wizard, see
+    # product.config.session._get_config_image_field
+    _cfg_image_size = 512
 
     @property
     def _prefixes(self):
@@ -68,6 +73,15 @@ class ProductConfigurator(models.TransientModel):
             image = cfg_sessions.get_config_image()
             configurator.product_img = image
 
+    @api.depends("product_tmpl_id", "value_ids", "custom_value_ids")
+    def _compute_cfg_image_url(self):
+        for configurator in self:
+            configurator.product_img_url = (
+                configurator.config_session_id.get_config_image_url(
+                    size=self._cfg_image_size
+                )
+            )
+
     @api.depends("product_tmpl_id", "product_tmpl_id.attribute_line_ids")
     def _compute_attr_lines(self):
         """Use compute method instead of related due to increased flexibility
@@ -131,6 +145,8 @@ class ProductConfigurator(models.TransientModel):
         cfg_val_ids,
         product_tmpl_id=False,
         config_session_id=False,
+        changed_attr_ids=None,
+        prev_domains=None,
     ):
         """Generate domains to be returned by onchange method in order
         to restrict the availble values of dynamically inserted fields
@@ -138,6 +154,10 @@ class ProductConfigurator(models.TransientModel):
         :param values: values argument passed to onchance wrapper
         :cfg_val_ids: current configuration passed as a list of value_ids
         (usually in the form of db value_ids + interface value_ids)
+        :param changed_attr_ids: ids of the attributes whose values changed
+            since prev_domains were computed
+        :param prev_domains: domains previously returned by this method, only
+            the attributes depending on changed_attr_ids are re-evaluated
 
         :returns: a dictionary of domains returned by onchance method
         """
@@ -148,6 +168,12 @@ class ProductConfigurator(models.TransientModel):
         if not config_session_id:
             config_session_id = self.config_session_id
 
+        recompute_attr_ids = None
+        if prev_domains is not None and changed_attr_ids is not None:
+            recompute_attr_ids = config_session_id._get_config_dependent_attrs(
+                product_tmpl_id.id, changed_attr_ids
+            )
+
         domains = {}
         check_avail_ids = cfg_val_ids[:]
         for line in product_tmpl_id.attribute_line_ids.sorted():
@@ -158,6 +184,19 @@ class ProductConfigurator(models.TransientModel):
 
             vals = values[field_name]
 
+            # Availability is unchanged if no attribute it depends on changed
+            if (
+                recompute_attr_ids is not None
+                and line.attribute_id.id not in recompute_attr_ids
+                and field_name in prev_domains
+            ):
+                avail_ids = list(prev_domains[field_name][0][2])
+                domains[field_name] = [("id", "in", avail_ids)]
+                check_avail_ids = list(
+                    set(check_avail_ids) - (set(line.value_ids.ids) - set(avail_ids))
+                )
+                continue
+
             # get available values
 
             avail_ids = config_session_id.values_available(
@@ -175,20 +214,26 @@ class ProductConfigurator(models.TransientModel):
                     continue
         return domains
 
-    def get_onchange_vals(self, cfg_val_ids, config_session_id=None):
-        """Onchange hook to add / modify returned values by onchange method"""
+    def get_onchange_vals(self, cfg_val_ids, config_session_id=None, custom_vals=None):
+        """Onchange hook to add / modify returned values by onchange method
+
+        :param custom_vals: dictionary {attribute_id: custom_value} of the
+                            custom values, the ones of the session if None
+        """
         if not config_session_id:
             config_session_id = self.config_session_id
 
         # Remove None from cfg_val_ids if exist
         cfg_val_ids = [val for val in cfg_val_ids if val]
 
-        product_img = config_session_id.get_config_image(cfg_val_ids)
-        price = config_session_id.get_cfg_price(cfg_val_ids)
+        product_img_url = config_session_id.get_config_image_url(
+            cfg_val_ids, size=self._cfg_image_size
+        )
+        price = config_session_id.get_cfg_price(cfg_val_ids, custom_vals=custom_vals)
         weight = config_session_id.get_cfg_weight(value_ids=cfg_val_ids)
 
         return {
-            "product_img": product_img,
+            "product_img_url": product_img_url,
             "value_ids": [(6, 0, cfg_val_ids)],
             "weight": weight,
             "price": price,
@@ -201,6 +246,7 @@ class ProductConfigurator(models.TransientModel):
         cfg_val_ids=None,
         product_tmpl_id=None,
         config_session_id=None,
+        custom_vals=None,
     ):
         """Generate a dictionary to return new values via onchange method.
         Domains hold the values available, this method enforces these values
@@ -208,6 +254,8 @@ class ProductConfigurator(models.TransientModel):
 
         :param dynamic_fields: Dictionary with the current {dynamic_field: val}
         :param domains: Odoo domains restricting attribute values
+        :param custom_vals: Dictionary with the current custom values
+                            {attribute_id: custom_value}
 
         :returns vals: Dictionary passed to {'value': vals} by onchange method
         """
@@ -231,7 +279,11 @@ class ProductConfigurator(models.TransientModel):
 
         final_cfg_val_ids = list(dynamic_fields.values())
 
-        vals.update(self.get_onchange_vals(final_cfg_val_ids, config_session_id))
+        vals.update(
+            self.get_onchange_vals(
+                final_cfg_val_ids, config_session_id, custom_vals=custom_vals
+            )
+        )
         # To solve the Multi selection problem removing extra []
         if "value_ids" in vals:
             val_ids = vals["value_ids"][0]
@@ -320,18 +372,86 @@ class ProductConfigurator(models.TransientModel):
         # Combine database values with wizard values_available
         cfg_val_ids = cfg_vals.ids + list(view_val_ids)
 
+        # Only re-evaluate the attributes affected by the values changed
+        # since the availability returned by the previous onchange
+        availability_state = self._get_availability_state(
+            values.get("availability_state"), product_tmpl_id, config_session_id
+        )
+        changed_attr_ids = prev_domains = None
+        if availability_state:
+            changed_val_ids = set(cfg_val_ids) ^ set(availability_state["cfg_val_ids"])
+            changed_attr_ids = (
+                self.env["product.attribute.value"]
+                .browse(changed_val_ids)
+                .mapped("attribute_id")
+                .ids
+            )
+            prev_domains = availability_state["domains"]
+
         domains = self.get_onchange_domains(
-            values, cfg_val_ids, product_tmpl_id, config_session_id
+            values,
+            cfg_val_ids,
+            product_tmpl_id,
+            config_session_id,
+            changed_attr_ids=changed_attr_ids,
+            prev_domains=prev_domains,
         )
+        custom_vals = self._get_onchange_custom_vals(values, config_session_id)
         vals = self.get_form_vals(
             dynamic_fields=dynamic_fields,
             domains=domains,
             product_tmpl_id=product_tmpl_id,
             config_session_id=config_session_id,
+            custom_vals=custom_vals,
+        )
+        vals["availability_state"] = json.dumps(
+            {
+                "product_tmpl_id": product_tmpl_id.id,
+                "version": config_session_id._get_config_restrictions(
+                    product_tmpl_id.id
+                )["version"],
+                "cfg_val_ids": cfg_val_ids,
+                "domains": domains,
+            }
         )
 
         return {"value": vals, "domain": domains}
 
+    @api.model
+    def _get_onchange_custom_vals(self, values, session):
+        """Return the custom values of the session updated with the ones of
+        the view as a dictionary {attribute_id: custom_value}"""
+        custom_field_prefix = self._prefixes.get("custom_field_prefix")
+        custom_vals = session._get_custom_vals_dict()
+        for k, v in values.items():
+            if k.startswith(custom_field_prefix):
+                custom_vals[int(k.split(custom_field_prefix)[1])] = v
+        return custom_vals
+
+    @api.model
+    def _get_availability_state(self, availability_state, product_tmpl_id, session):
+        """Parse the availability state returned by the previous onchange
+
+        :param availability_state: json string sent back by the client
+        :param product_tmpl_id: record set of the configured product template
+        :param session: record set of product.config.session
+        :returns: dictionary with the configuration and the domains of the
+                  previous onchange or None if they can not be reused
+        """
+        if not availability_state or not product_tmpl_id:
+            return None
+        try:
+            availability_state = json.loads(availability_state)
+        except ValueError:
+            return None
+        config_restrictions = session._get_config_restrictions(product_tmpl_id.id)
+        if (
+            availability_state.get("product_tmpl_id") != product_tmpl_id.id
+            or availability_state.get("version") != config_restrictions["version"]
+        ):
+            return None
+        return availability_state
+
     def onchange(self, values, field_name, field_onchange):
         """Override the onchange wrapper to return domains to dynamic
         fields as onchange isn't triggered for non-db fields
@@ -376,6 +496,16 @@ class ProductConfigurator(models.TransientModel):
         help="Set only when re-configuring a existing variant",
     )
     product_img = fields.Binary(compute="_compute_cfg_image", readonly=True)
+    product_img_url = fields.Char(
+        compute="_compute_cfg_image_url",
+        readonly=True,
+        help="Url of the image matching the configuration, the form loads it "
+        "through /web/image instead of receiving the image on every onchange",
+    )
+    availability_state = fields.Text(
+        help="Configuration and availability computed by the last onchange, "
+        "used to only re-evaluate the attributes affected by a change"
+    )
     state = FreeSelection(
         selection="get_state_selection", default="select", string="State"
     )
@@ -385,13 +515,18 @@ class ProductConfigurator(models.TransientModel):
         """Save values when change state of wizard by clicking on statusbar"""
         if self.env.context.get("allow_preset_selection"):
             self = self.with_context(allow_preset_selection=False)
-        if self.config_session_id:
-            self.config_session_id._origin.write(
-                {
-                    "value_ids": [[6, 0, self.value_ids.ids]],
-                    "config_step": self.state,
-                }
-            )
+        session = self.config_session_id._origin
+        if not session:
+            return
+        # Only persist what changed, the session turns the replacement of
+        # the values into the matching add and remove commands
+        vals = {}
+        if set(session.value_ids.ids) != set(self.value_ids.ids):
+            vals["value_ids"] = [[6, 0, self.value_ids.ids]]
+        if session.config_step != self.state:
+            vals["config_step"] = self.state
+        if vals:
+            session.write(vals)
 
     @api.onchange("product_preset_id")
     def _onchange_product_preset(self):
@@ -420,9 +555,6 @@ class ProductConfigurator(models.TransientModel):
         """Artificially inject fields which are dynamically created using the
         attribute_ids on the product.template as reference"""
 
-        field_prefix = self._prefixes.get("field_prefix")
-        custom_field_prefix = self._prefixes.get("custom_field_prefix")
-
         res = super(ProductConfigurator, self).fields_get(
             allfields=allfields, attributes=attributes
         )
@@ -436,48 +568,59 @@ class ProductConfigurator(models.TransientModel):
 
         # Get the wizard object from the database
         wiz = self.browse(wizard_id)
-        active_step_id = wiz.state
 
         # If the product template is not set it is still at the 1st step
         if not wiz.product_tmpl_id:
             return res
 
-        cfg_step_lines = wiz.product_tmpl_id.config_step_line_ids
-
-        try:
-            # Get only the attribute lines for the next step if defined
-            active_step_line = cfg_step_lines.filtered(
-                lambda l: l.id == int(active_step_id)
-            )
-            if active_step_line:
-                attribute_lines = active_step_line.attribute_line_ids
-            else:
-                attribute_lines = wiz.product_tmpl_id.attribute_line_ids
-        except Exception:
-            # If no configuration steps exist then get all attribute lines
-            attribute_lines = wiz.product_tmpl_id.attribute_line_ids
-
-        attribute_lines = wiz.product_tmpl_id.attribute_line_ids
+        # The descriptors are cached per template, only the domains
+        # restricting the values to the available ones depend on the wizard
+        dynamic_fields = self._get_dynamic_fields_static(wiz.product_tmpl_id.id)
+        config_session = wiz.config_session_id
+        custom_val_id = config_session.get_custom_value_id().id
+        for field_name, (descriptor, line_value_ids, custom) in dynamic_fields.items():
+            field = dict(descriptor)
+            if line_value_ids is not None:
+                value_ids = config_session.values_available(
+                    check_val_ids=list(line_value_ids)
+                )
+                # If attribute lines allows custom values add the
+                # generic "Custom" attribute.value to the list of options
+                if custom:
+                    value_ids.append(custom_val_id)
+                field["domain"] = [("id", "in", value_ids)]
+            res[field_name] = field
+        return res
 
-        # Generate relational fields with domains restricting values to
-        # the corresponding attributes
+    @api.model
+    @tools.ormcache("product_tmpl_id", "self.env.lang")
+    def _get_dynamic_fields_static(self, product_tmpl_id):
+        """Generate the descriptors of the dynamic fields of a product
+        template, without the domains depending on the configuration
+
+        The cache is cleared whenever an attribute, an attribute line, a
+        configuration step line or a configuration restriction changes.
+
+        :param product_tmpl_id: id of the product.template
+        :returns: dictionary {field_name: (descriptor, value_ids, custom)}
+                  where value_ids is the tuple of the values of the attribute
+                  line (None for custom fields) and custom tells if the line
+                  allows custom values
+        """
+        field_prefix = self._prefixes.get("field_prefix")
+        custom_field_prefix = self._prefixes.get("custom_field_prefix")
+        product_tmpl = self.env["product.template"].browse(product_tmpl_id)
 
         # Default field attributes
         default_attrs = self.get_field_default_attrs()
 
-        for line in attribute_lines:
+        # Generate relational fields with domains restricting values to
+        # the corresponding attributes
+        dynamic_fields = {}
+        for line in product_tmpl.attribute_line_ids:
             attribute = line.attribute_id
-            value_ids = line.value_ids.ids
-
-            value_ids = wiz.config_session_id.values_available(check_val_ids=value_ids)
 
-            # If attribute lines allows custom values add the
-            # generic "Custom" attribute.value to the list of options
             if line.custom:
-                config_session_obj = self.env["product.config.session"]
-                custom_val = config_session_obj.get_custom_value_id()
-                value_ids.append(custom_val.id)
-
                 # Set default field type
                 field_type = "char"
 
@@ -491,24 +634,31 @@ class ProductConfigurator(models.TransientModel):
                         field_type = custom_type
 
                 # TODO: Implement custom string on custom attribute
-                res[custom_field_prefix + str(attribute.id)] = dict(
-                    default_attrs,
-                    string="Custom",
-                    type=field_type,
-                    sequence=line.sequence,
+                dynamic_fields[custom_field_prefix + str(attribute.id)] = (
+                    dict(
+                        default_attrs,
+                        string="Custom",
+                        type=field_type,
+                        sequence=line.sequence,
+                    ),
+                    None,
+                    True,
                 )
 
             # Add the dynamic field to the resultset using the convention
             # "__attribute-DBID" to later identify and extract it
-            res[field_prefix + str(attribute.id)] = dict(
-                default_attrs,
-                type="many2many" if line.multi else "many2one",
-                domain=[("id", "in", value_ids)],
-                string=line.attribute_id.name,
-                relation="product.attribute.value",
-                sequence=line.sequence,
+            dynamic_fields[field_prefix + str(attribute.id)] = (
+                dict(
+                    default_attrs,
+                    type="many2many" if line.multi else "many2one",
+                    string=line.attribute_id.name,
+                    relation="product.attribute.value",
+                    sequence=line.sequence,
+                ),
+                tuple(line.value_ids.ids),
+                line.custom,
             )
-        return res
+        return dynamic_fields
 
     @api.model
     def fields_view_get(
@@ -545,12 +695,46 @@ class ProductConfigurator(models.TransientModel):
         }
         res["fields"].update(dynamic_fields)
 
-        mod_view = self.add_dynamic_fields(res, dynamic_fields, wiz)
+        if not wiz.product_tmpl_id:
+            mod_view = self.add_dynamic_fields(res, dynamic_fields, wiz)
+            res.update({"arch": etree.tostring(mod_view)})
+            return res
+
+        # The generated arch only depends on the template, the values
+        # available in the wizard are restricted by the field domains
+        arch = self._get_dynamic_arch(
+            wiz.product_tmpl_id.id,
+            res["view_id"],
+            frozenset(self.env.user.groups_id.ids),
+        )
 
         # Update result dict from super with modified view
-        res.update({"arch": etree.tostring(mod_view)})
+        res.update({"arch": arch})
         return res
 
+    @api.model
+    @tools.ormcache("product_tmpl_id", "view_id", "self.env.lang", "groups")
+    def _get_dynamic_arch(self, product_tmpl_id, view_id, groups):
+        """Return the arch of the configuration view of a product template,
+        see add_dynamic_fields. The cache is cleared along with the one of
+        _get_dynamic_fields_static
+
+        :param product_tmpl_id: id of the product.template
+        :param view_id: id of the ir.ui.view the arch is generated from
+        :param groups: ids of the groups of the user the arch is built for
+        """
+        res = super(ProductConfigurator, self).fields_view_get(
+            view_id=view_id, view_type="form"
+        )
+        dynamic_fields = {
+            field_name: descriptor
+            for field_name, (descriptor, _values, _custom) in (
+                self._get_dynamic_fields_static(product_tmpl_id).items()
+            )
+        }
+        wiz = self.new({"product_tmpl_id": product_tmpl_id})
+        return etree.tostring(self.add_dynamic_fields(res, dynamic_fields, wiz))
+
     @api.model
     def setup_modifiers(self, node, field=None, context=None):
         """Processes node attributes and field descriptors to generate
@@ -582,10 +766,37 @@ class ProductConfigurator(models.TransientModel):
         )
         transfer_modifiers_to_node(modifiers=modifiers, node=node)
 
+    @api.model
+    def _get_attr_depends(self, attr_line, field_prefix, wiz):
+        """Return the values of the dependee fields enabling an attribute line
+        whose values are all restricted by config lines
+
+        :param attr_line: product.template.attribute.line record
+        :param field_prefix: prefix of the dynamic attribute fields
+        :param wiz: product.configurator record
+        :returns: dictionary {dependee_field: set(attribute_value_ids)} or
+                  None if some values of the attribute line are unrestricted
+        """
+        config_restrictions = self.env[
+            "product.config.session"
+        ]._get_config_restrictions(wiz.product_tmpl_id.id)
+        attr_depends = config_restrictions["attr_line_depends"].get(attr_line.id)
+        if attr_depends is None:
+            return None if attr_line.value_ids else {}
+        return {
+            field_prefix + str(attr_id): set(value_ids)
+            for attr_id, value_ids in attr_depends.items()
+        }
+
     def prepare_attrs_initial(
         self, attr_lines, field_prefix, custom_field_prefix, dynamic_fields, wiz
     ):
         cfg_step_ids = []
+        # Steps and dependencies of the attribute lines are precomputed with
+        # the compiled restrictions of the template
+        config_restrictions = self.env[
+            "product.config.session"
+        ]._get_config_restrictions(wiz.product_tmpl_id.id)
         for attr_line in attr_lines:
 
             attribute_id = attr_line.attribute_id.id
@@ -596,8 +807,8 @@ class ProductConfigurator(models.TransientModel):
             if field_name not in dynamic_fields:
                 continue
 
-            config_steps = wiz.product_tmpl_id.config_step_line_ids.filtered(
-                lambda x: attr_line in x.attribute_line_ids
+            config_steps = self.env["product.config.step.line"].browse(
+                config_restrictions["attr_line_steps"].get(attr_line.id, ())
             )
 
             # attrs property for dynamic fields
@@ -623,39 +834,13 @@ class ProductConfigurator(models.TransientModel):
                 pass
                 # TODO: Implement restrictions for ranges
 
-            config_lines = wiz.product_tmpl_id.config_line_ids
-            dependencies = config_lines.filtered(
-                lambda cl: cl.attribute_line_id == attr_line
-            )
-
             # If an attribute field depends on another field from the same
             # configuration step then we must use attrs to enable/disable the
             # required and readonly depending on the value entered in the
             # dependee
 
-            if attr_line.value_ids <= dependencies.mapped("value_ids"):
-                attr_depends = {}
-                domain_lines = dependencies.mapped("domain_id.domain_line_ids")
-                for domain_line in domain_lines:
-                    attr_id = domain_line.attribute_id.id
-                    attr_field = field_prefix + str(attr_id)
-                    attr_lines = wiz.product_tmpl_id.attribute_line_ids
-                    # If the fields it depends on are not in the config step
-                    # allow to update attrs for all attribute.\ otherwise
-                    # required will not work with stepchange using statusbar.
-                    # if config_steps and wiz.state not in cfg_step_ids:
-                    #     continue
-                    if attr_field not in attr_depends:
-                        attr_depends[attr_field] = set()
-                    if domain_line.condition == "in":
-                        attr_depends[attr_field] |= set(domain_line.value_ids.ids)
-                    elif domain_line.condition == "not in":
-                        val_ids = attr_lines.filtered(
-                            lambda l: l.attribute_id.id == attr_id
-                        ).value_ids
-                        val_ids = val_ids - domain_line.value_ids
-                        attr_depends[attr_field] |= set(val_ids.ids)
-
+            attr_depends = self._get_attr_depends(attr_line, field_prefix, wiz)
+            if attr_depends is not None:
                 for dependee_field, val_ids in attr_depends.items():
                     if not val_ids:
                         continue
@@ -1 +1,2 @@
+from . import product_config
 from . import purchase
@@ -0,0 +1,32 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import _, models
+from odoo.exceptions import UserError
+
+
+class ProductConfigSession(models.Model):
+    _inherit = "product.config.session"
+
+    def _configure_target(self, target):
+        """Add the configured variant to the purchase order of the target as
+        the purchase configurator wizard does
+
+        :param target: dictionary {'model': 'purchase.order', 'res_id': order
+                       id, 'quantity': optional ordered quantity}
+        """
+        if target.get("model") != "purchase.order":
+            return super(ProductConfigSession, self)._configure_target(target)
+        self.ensure_one()
+        order = self.env["purchase.order"].browse(target.get("res_id")).exists()
+        if not order:
+            raise UserError(_("Purchase order %s not found") % target.get("res_id"))
+        # Build the line as the purchase configurator wizard does
+        wizard = self.env["product.configurator.purchase"].new(
+            {"order_id": order.id, "config_session_id": self.id}
+        )
+        line_vals = wizard._get_order_line_vals(self.product_id.id)
+        line_vals.update(
+            {"order_id": order.id, "product_qty": target.get("quantity", 1.0)}
+        )
+        values = wizard._get_order_line_onchange_vals(line_vals)
+        return self.env["purchase.order.line"].create(values)
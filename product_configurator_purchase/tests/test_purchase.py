@@ -43,3 +43,55 @@ class Purchase(ProductConfiguratorTestCases):
             "Error: If product_tmpl not exsits\
             Method: action_config_start()",
         )
+
+    def test_01_configure_many(self):
+        purchase_order_id = self.purchaseOrder.create(
+            {
+                "partner_id": self.resPartner.id,
+                "currency_id": self.currency_id.id,
+                "date_order": datetime.now(),
+                "date_planned": datetime.now(),
+                "company_id": self.company_id.id,
+            }
+        )
+        value_ids = [
+            self.value_gasoline.id,
+            self.value_220i.id,
+            self.value_red.id,
+            self.value_rims_378.id,
+            self.value_model_sport_line.id,
+            self.value_tapistry.id,
+            self.value_transmission.id,
+            self.value_options_2.id,
+        ]
+        results = self.env["product.config.session"].configure_many(
+            [
+                {
+                    "product_tmpl_id": self.ProductTemplate.id,
+                    "value_ids": value_ids,
+                    "target": {
+                        "model": "purchase.order",
+                        "res_id": purchase_order_id.id,
+                        "quantity": 3.0,
+                    },
+                }
+            ]
+        )
+        self.assertEqual(
+            purchase_order_id.order_line.ids,
+            [results[0]["line_id"]],
+            "Error: If purchase order line not created\
+            Method: configure_many()",
+        )
+        self.assertEqual(
+            purchase_order_id.order_line.product_qty,
+            3.0,
+            "Error: If ordered quantity not set\
+            Method: _configure_target()",
+        )
+        self.assertEqual(
+            purchase_order_id.order_line.config_session_id.id,
+            results[0]["session_id"],
+            "Error: If configuration session not linked to the line\
+            Method: _configure_target()",
+        )
@@ -28,13 +28,10 @@ class ProductConfiguratorPurchase(models.TransientModel):
             "price_unit": self.config_session_id.price,
         }
 
-    def action_config_done(self):
-        """Parse values and execute final code before closing the wizard"""
-        res = super(ProductConfiguratorPurchase, self).action_config_done()
-        if res.get("res_model") == self._name:
-            return res
+    def _get_order_line_onchange_vals(self, line_vals):
+        """Complete line_vals with the values set by the onchange of the
+        product on the order line"""
         model_name = "purchase.order.line"
-        line_vals = self._get_order_line_vals(res["res_id"])
         order_line_obj = self.env[model_name]
         cfg_session = self.config_session_id
         specs = cfg_session.get_onchange_specifications(model=model_name)
@@ -47,6 +44,15 @@ class ProductConfiguratorPurchase(models.TransientModel):
             for line in values.get("taxes_id")[1:]:
                 taxes_id.append(line[1])
             values["taxes_id"] = [(6, 0, taxes_id)]
+        return values
+
+    def action_config_done(self):
+        """Parse values and execute final code before closing the wizard"""
+        res = super(ProductConfiguratorPurchase, self).action_config_done()
+        if res.get("res_model") == self._name:
+            return res
+        line_vals = self._get_order_line_vals(res["res_id"])
+        values = self._get_order_line_onchange_vals(line_vals)
         if self.order_line_id:
             self.order_line_id.write(values)
         else:
@@ -44,3 +44,47 @@ class SaleOrder(TC.ProductConfiguratorTestCases):
             self.config_product.id,
             "Error: If product_tmpl not exists" " Method: action_config_start()",
         )
+
+    def test_01_configure_many(self):
+        sale_order_id = self.SaleOrderId.create(
+            {
+                "partner_id": self.resPartner.id,
+                "partner_invoice_id": self.resPartner.id,
+                "partner_shipping_id": self.resPartner.id,
+            }
+        )
+        value_ids = [
+            self.value_gasoline.id,
+            self.value_220i.id,
+            self.value_red.id,
+            self.value_rims_378.id,
+            self.value_model_sport_line.id,
+            self.value_tapistry.id,
+            self.value_transmission.id,
+            self.value_options_2.id,
+        ]
+        results = self.env["product.config.session"].configure_many(
+            [
+                {
+                    "product_tmpl_id": self.config_product.id,
+                    "value_ids": value_ids,
+                    "target": {
+                        "model": "sale.order",
+                        "res_id": sale_order_id.id,
+                        "quantity": 2.0,
+                    },
+                }
+            ]
+        )
+        self.assertEqual(
+            sale_order_id.order_line.ids,
+            [results[0]["line_id"]],
+            "Error: If sale order line not created\
+            Method: configure_many()",
+        )
+        self.assertEqual(
+            sale_order_id.order_line.product_uom_qty,
+            2.0,
+            "Error: If ordered quantity not set\
+            Method: _configure_target()",
+        )
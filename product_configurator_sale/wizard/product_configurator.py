@@ -29,13 +29,10 @@ class ProductConfiguratorSale(models.TransientModel):
         )
         return line_vals
 
-    def action_config_done(self):
-        """Parse values and execute final code before closing the wizard"""
-        res = super(ProductConfiguratorSale, self).action_config_done()
-        if res.get("res_model") == self._name:
-            return res
+    def _get_order_line_onchange_vals(self, line_vals):
+        """Complete line_vals with the values set by the onchange of the
+        product on the order line"""
         model_name = "sale.order.line"
-        line_vals = self._get_order_line_vals(res["res_id"])
 
         # Call onchange explicite as write and create
         # will not trigger onchange automatically
@@ -46,6 +43,15 @@ class ProductConfiguratorSale(models.TransientModel):
         values = updates.get("value", {})
         values = cfg_session.get_vals_to_write(values=values, model=model_name)
         values.update(line_vals)
+        return values
+
+    def action_config_done(self):
+        """Parse values and execute final code before closing the wizard"""
+        res = super(ProductConfiguratorSale, self).action_config_done()
+        if res.get("res_model") == self._name:
+            return res
+        line_vals = self._get_order_line_vals(res["res_id"])
+        values = self._get_order_line_onchange_vals(line_vals)
 
         if self.order_line_id:
             self.order_line_id.write(values)